@@ -18,6 +18,9 @@ An SQLebra database is represented by a single table with columns:
     + child_id: Identifier of the rows child variable (see "Nested objects" below).
     + root: 1 signals the main variable row.
     + user_defined: 1 signals a user defined variable.
+    + blob_val: Binary value
+
+A second table, named after the first one with suffix "_seq", holds the sequence used to allocate new ids.
 
 Nested objects
 ==============
@@ -0,0 +1,92 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+
+class AsyncBaseDB:
+    """
+    asyncio front-end of an SQL database handler. Database operations run on a dedicated thread pool, so that they
+    do not block the event loop and many of them can be awaited at once.
+    """
+
+    # Class of the wrapped database handler
+    db_class = None
+    # Keyword arguments forced on the wrapped database handler
+    db_kwargs = {}
+    # Default number of worker threads
+    max_workers = 4
+
+    def __init__(self, *args, max_workers=None, **kwargs):
+        """
+        :param args: Positional arguments of the database handler (see BaseDB.__init__)
+        :param max_workers: (int) Maximum number of database operations running at the same time.
+        :param kwargs: Keyword arguments of the database handler (see BaseDB.__init__)
+        """
+        self.db = self.db_class(*args, **{**kwargs, **self.db_kwargs})
+        self._executor = ThreadPoolExecutor(max_workers or self.max_workers, thread_name_prefix='sqlebra')
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Run a blocking function on the database thread pool.
+
+        :param func: (callable) Called with the database handler followed by <args> and <kwargs>. Worker threads
+            may use different connections, so operations which belong to the same transaction (e.g. several writes
+            followed by a commit) must be grouped in a single function.
+        :return: Result of <func>
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, self.db, *args, **kwargs))
+
+    # Connection
+    # ---------------------------------------------------------------
+
+    async def open(self):
+        await self.run(lambda db: db.open())
+        return self
+
+    async def close(self):
+        """Disconnect from the database and stop the thread pool"""
+        await self.run(lambda db: db.disconnect())
+        self._executor.shutdown(wait=True)
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    # Variables
+    # ---------------------------------------------------------------
+
+    async def get(self, item):
+        """Return the python value of a variable"""
+        return await self.run(lambda db: db[item].py)
+
+    async def get_many(self, items):
+        """Return the python values of several variables, loaded concurrently"""
+        return await asyncio.gather(*(self.get(item) for item in items))
+
+    async def set(self, item, value):
+        """Set the value of a variable, and commit the change"""
+        def set_(db):
+            db[item] = value
+            db.commit()
+        await self.run(set_)
+
+    async def delete(self, item):
+        """Delete a variable, and commit the change"""
+        def delete_(db):
+            db[item].delete()
+            db.commit()
+        await self.run(delete_)
+
+    async def contains(self, item):
+        return await self.run(lambda db: item in db)
+
+    async def len(self):
+        """Number of variables in the database"""
+        return await self.run(len)
+
+    async def py(self):
+        """Python dictionary with all the variables in the database"""
+        return await self.run(lambda db: db.py)
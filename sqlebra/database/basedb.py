@@ -1,8 +1,12 @@
 import os
+import time
 from sqlebra import utils
 from sqlebra import exceptions as ex
 from sqlebra import py2sql
+from sqlebra import variables as var
 from .basetransaction import BaseTransaction
+from .dialect import Dialect
+from .cache import RowCache
 
 
 class BaseDB:
@@ -10,20 +14,77 @@ class BaseDB:
     Base class holding an SQL database handler
     """
 
+    # Columns of the database table, as (name, SQL type)
+    _columns = (
+        ('id', 'INTEGER'),
+        ('name', 'TEXT'),
+        ('class', 'TEXT'),
+        ('key', 'TEXT'),
+        ('ind', 'INTEGER'),
+        ('bool_val', 'TINYINT(1)'),
+        ('int_val', 'INTEGER'),
+        ('real_val', 'REAL'),
+        ('txt_val', 'TEXT'),
+        ('child_id', 'INTEGER'),
+        ('root', 'TINYINT(1)'),
+        ('user_defined', 'TINYINT(1)'),
+        ('blob_val', 'BLOB'),
+        ('hash', 'BIGINT'),  # Content hash of the value (see BaseDB.content_hash). NULL when discarded by a write.
+    )
+
+    # Indexes defined on the database table, as {suffix: columns}. The index name is '<table name>_<suffix>'.
+    _indexes = {
+        'tree': ('id', 'root desc', 'ind'),  # Variables (root row first) and their numerically indexed items
+        'item': ('id', 'key'),  # Text indexed items
+        'name': ('name', 'root', 'user_defined'),  # Variables by name
+        'hash': ('hash', 'id', 'root'),  # Items by content hash. Led by 'hash', so it is only used for hash lookups.
+        'child': ('child_id', ),  # Items referencing a nested value
+    }
+
+    # SQL syntax of the database engine
+    dialect = Dialect()
+
+    # Maximum number of compiled SQL queries held by each database handler
+    _sql_cache_size = 512
+
+    # Number of rows fetched at a time by BaseDB.stream
+    stream_size = 256
+
     @property
     def py(self):
-        x = self[{'user_defined': True, 'root': True}][2]
-        py = {}
-        for x_n in x:
-            py[x_n.row[1]] = x_n.py
-        return py
+        """Python dictionary with all the variables, loaded at once (see BaseDB.iter_items to load them one by one)"""
+        tree = self.tree()
+        return {rows[0][1]: self.tree2py(tree, id) for id, rows in tree.items() if rows[0][11]}
+
+    def iter_names(self):
+        """Yield the names of the user defined variables, streamed from a single query"""
+        query = self._query(('iter_names', ), lambda: 'select name from {} where root = 1 and user_defined = 1 '
+                                                      'order by id'.format(self.name))
+        for row in self.stream(query):
+            yield row[0]
+
+    def iter_items(self, lazy=False):
+        """
+        Yield the user defined variables one at a time, so that only one of them is held in memory.
+
+        :param lazy: (bool) If True, yield the SQLebra object of each variable, whose value is only read from the
+            database when requested. Otherwise, yield its python value.
+        :return: (generator) of (name, value) tuples
+        """
+        query = self._query(('iter_items', ), lambda: 'select * from {} where root = 1 and user_defined = 1 '
+                                                      'order by id'.format(self.name))
+        for row in self.stream(query):
+            obj = self._row2object_(row)
+            yield row[1], obj if lazy else obj.py
 
     @property
     def file(self):
         """Full path file name of the SQL database file"""
         return self._file
 
-    def __init__(self, file, name='sqlebra', mode='+'):
+    def __init__(self, file, name='sqlebra', mode='+', ndarray_layout=None, ndarray_chunks=None,
+                 ndarray_compression=None, list_layout=None, cache_size=None,
+                 group_commit=None, group_interval=None, dedup=False):
         """
         :param file: Full path file name of the SQL database file
         :param mode:
@@ -31,6 +92,32 @@ class BaseDB:
             'x' to create a new file. Raises an error if the file exists.
             'w' to create a new file, and overwrite it if the file already exists.
             '+' to open an existing file or create one if it does not exit.
+        :param ndarray_layout: Storage layout of new numpy arrays:
+            None to store each element in its own row.
+            'blob' to store the raw data buffer in a single row.
+            'chunk' to split the array into tiles, each stored in its own row.
+        :param ndarray_chunks: (int or tuple) Shape of the tiles of 'chunk' arrays. An int sets the size of every
+            dimension. A tuple sets the tiles of arrays with as many dimensions. By default, and for arrays with a
+            different number of dimensions, tiles of about 1MB are used.
+        :param ndarray_compression: Compression of the tiles of 'chunk' arrays: None or 'zlib'.
+        :param list_layout: Storage layout of new lists:
+            None to number items consecutively. Inserting or removing an item renumbers the items to its right.
+            'sparse' to number items in steps of list_.gap, so that inserting or removing an item leaves the other
+            items untouched.
+        :param cache_size: (int) If given, keep up to <cache_size> variable and item lookups in memory (see
+            BaseDB.cache_info). Writes through this handler invalidate the cached lookups of the ids they touch.
+        :param group_commit: (int) If given, writes made outside explicit transactions are committed in groups of
+            at least <group_commit> statements, rather than waiting for an explicit commit. Groups are committed
+            once the operation making the last write completes (e.g. setting a variable), so that they only hold
+            whole operations. At most one group of writes is lost if the process stops before the group is committed.
+        :param group_interval: (float) Milliseconds. If given, a group is also committed by the first operation
+            completed <group_interval> ms after the first write of the group. Pending writes are committed by
+            BaseDB.flush, BaseDB.commit and on disconnect.
+        :param dedup: (bool) If True, nested values written as items of other values are stored once per content
+            (see BaseDB.content_hash): identical values share a single copy, referenced by the 'child_id' of every
+            item holding them. A shared value is deleted with its last reference, and cannot be written to: replace
+            the items holding it instead. Files opened with dedup are marked as holding shared values, which every
+            handler then protects.
         """
         if mode == 'r':
             if not os.path.exists(file):
@@ -47,42 +134,151 @@ class BaseDB:
         else:
             raise ValueError("Mode '{}' is not supported.".format(mode))
         self._file = file
+        self.mode = mode
         # Database name
         self.name = name
+        # Storage layout of new nested variables, by python class name
+        self.layouts = {'ndarray': ndarray_layout, 'list': list_layout}
+        self.layout_options = {'ndarray': {'chunks': ndarray_chunks, 'compression': ndarray_compression}}
         # Internal variables
         self._conx = None  # Database connection
         self._c = None  # Database connection cursor
         self._transaction_level = 0  # Transaction level. 0 means no transaction
+        self._sql_cache = utils.LRUCache(self._sql_cache_size)  # SQL queries by shape. See BaseDB._query
+        self._cache = RowCache(cache_size) if cache_size else None  # Rows of variable and item lookups
+        self.group_commit = group_commit
+        self.group_interval = group_interval
+        # Writes pending of a group commit, and depth of the running operations. See BaseDB._group_write_
+        self._group = {'writes': 0, 'start': 0.0, 'depth': 0}
+        self.dedup = dedup
+        self._shared_values = dedup  # True if the file may hold shared values. See BaseDB._check_shared_
+        # Columns of the database table. Files of older versions opened to read may lack some of BaseDB._columns
+        self._table_columns = tuple(c for c, _ in self._columns)
 
     def open(self):
         self.connect()
         if not self.exists():
             self.init()
             self.commit()
+        elif self.mode != 'r':
+            self.upgrade()
+        self._table_columns = tuple(self.columns())
+        self._check_shared_()
         return self
 
+    def _check_shared_(self):
+        """
+        Check whether the file may hold values shared by several items (see 'dedup' in BaseDB.__init__), recorded
+        in the sequence table. Handlers opened with dedup record it, so that any handler of the file checks writes
+        and deletions of shared values. Files which never held shared values skip these checks.
+        """
+        if not self.exists(self._seq_name):  # Older file, opened to read
+            self._shared_values = self.dedup
+            return
+        p = self.dialect.placeholder
+        recorded = len(self.execute('select value from {} where name = {p}'.format(self._seq_name, p=p),
+                                    ('dedup', ))) > 0
+        if self.dedup and not recorded:
+            self.execute(self.dialect.upsert(self._seq_name, ('name', 'value'), ('name', )), ('dedup', 1))
+            self.commit()
+        self._shared_values = self.dedup or recorded
+
     def init(self):
         """Initialize database table"""
-        self.execute(
-            'create table {} ('.format(self.name) +
-            'id INTEGER,'
-            'name TEXT,'
-            'class TEXT,'
-            'key TEXT,'
-            'ind INTEGER,'
-            'bool_val TINYINT(1),'
-            'int_val INTEGER,'
-            'real_val REAL,'
-            'txt_val TEXT,'
-            'child_id INTEGER,'
-            'root TINYINT(1),'
-            'user_defined TINYINT(1)'
-            ')')
+        self.execute('create table {} ({})'.format(
+            self.name, ', '.join('{} {}'.format(self.dialect.quote(c), self.dialect.type(t)) for c, t in self._columns)))
+        for suffix in self._indexes:
+            self.create_index(suffix)
+        self._init_sequences()
+        return self
+
+    @property
+    def _seq_name(self):
+        """Name of the table holding the id and name sequences (see BaseDB.free_id and BaseDB.free_names)"""
+        return '{}_seq'.format(self.name)
+
+    def _init_sequences(self):
+        """
+        Create the sequence table and any missing sequence. The id sequence starts after any id already in use.
+
+        :return: (bool) True if anything was created
+        """
+        created = False
+        if not self.exists(self._seq_name):
+            self.execute('create table {} (name VARCHAR(64) PRIMARY KEY, value INTEGER)'.format(self._seq_name))
+            created = True
+        sequences = [r[0] for r in self.execute('select name from {}'.format(self._seq_name))]
+        # Sequences are seeded with an upsert, in case another connection is initializing them at the same time
+        seed = self.dialect.upsert(self._seq_name, ('name', 'value'), ('name', ))
+        if 'id' not in sequences:
+            id = self.execute('select coalesce(max(id) + 1, 0) from {}'.format(self.name))[0][0]
+            self.execute(seed, ('id', id))
+            created = True
+        if 'name' not in sequences:
+            self.execute(seed, ('name', 0))
+            created = True
+        return created
+
+    def _reserve(self, sequence, n=1):
+        """
+        Reserve the next n values of a sequence. Reserved values are held by the current transaction: other
+        connections wait for it to finish before reserving theirs.
+
+        :param sequence: (str) 'id' or 'name'
+        :param n: (int) Number of values to reserve
+        :return: (int) First reserved value
+        """
+        p = self.dialect.placeholder
+        self.execute('update {} set value = value + {p} where name = {p}'.format(self._seq_name, p=p), (n, sequence))
+        return self.execute('select value from {} where name = {p}'.format(self._seq_name, p=p), (sequence, ))[0][0] - n
+
+    def upgrade(self):
+        """
+        Bring a database table created by an older version of SQLebra up to date (i.e. add missing columns and
+        indexes)
+        """
+        columns = self.columns()
+        missing_columns = [(c, t) for c, t in self._columns if c not in columns]
+        for column, column_type in missing_columns:
+            self.execute('alter table {} add column {} {}'.format(
+                self.name, self.dialect.quote(column), self.dialect.type(column_type)))
+        indexes = self.indexes()
+        missing = [suffix for suffix in self._indexes if self._index_name(suffix) not in indexes]
+        for suffix in missing:
+            self.create_index(suffix)
+        missing_sequences = self._init_sequences()
+        if len(missing_columns) > 0 or len(missing) > 0 or missing_sequences:
+            self.commit()
+        return self
+
+    def _index_name(self, suffix):
+        return '{}_{}'.format(self.name, suffix)
+
+    def create_index(self, suffix):
+        """
+        Create one of the indexes defined in BaseDB._indexes
+
+        :param suffix: (str) Index name suffix
+        """
+        types = dict(self._columns)
+        self.execute('create index {} on {} ({})'.format(
+            self._index_name(suffix), self.name,
+            ', '.join(self.dialect.index_column(c, types[c.split(' ')[0]]) for c in self._indexes[suffix])))
         return self
 
+    def indexes(self):
+        """Return the names of the indexes defined on the database table"""
+        raise NotImplementedError
+
+    def columns(self):
+        """Return the names of the columns of the database table"""
+        raise NotImplementedError
+
     def clear(self):
         """Delete database table"""
         self.execute("drop table {}".format(self.name))
+        self.execute("drop table {}".format(self._seq_name))
+        self._invalidate_()
         return self
 
     # Python-SQL communication channel
@@ -109,6 +305,28 @@ class BaseDB:
         """
         raise NotImplementedError
 
+    def executemany(self, query, pars):
+        """
+        Execute an sql query once for each set of parameters.
+
+        :param query: (str) SQL query
+        :param pars: (list of lists) Parameters required by each execution of the SQL query.
+        """
+        raise NotImplementedError
+
+    def _query(self, key, build):
+        """
+        Return the SQL query compiled for 'key', building it with 'build()' if it is not cached.
+
+        :param key: (tuple) Shape of the query. Queries with the same shape share the same SQL string.
+        :param build: (callable) Return the SQL query.
+        """
+        query = self._sql_cache.get(key)
+        if query is None:
+            query = build()
+            self._sql_cache[key] = query
+        return query
+
     def insert(self, value):
         """
         Insert values in a table.
@@ -116,52 +334,112 @@ class BaseDB:
         :param value: (dict) with (key, value) = (column, value). Builds the "(<column>) value (<value>)"
             clause of the SQL insert query.
         """
-        # Build insert query
-        into_sql = ''
-        col_sql = ''
-        val_sql = []
-        for key, val in value.items():
-            into_sql += ', {}'.format(key)
-            col_sql += ', ?'
-            val_sql.append(val)
-        # Execute query
-        self.execute("insert into {} ({}) values ({})".format(self.name, into_sql[2:], col_sql[2:]), val_sql)
+        columns = tuple(value.keys())
+        query = self._query(('insert', columns), lambda: self._build_insert(columns))
+        self.execute(query, list(value.values()))
+        if self._cache is not None:
+            self._invalidate_([value['id']] if 'id' in value else None)
+        self._group_write_()
+
+    def insert_many(self, rows):
+        """
+        Insert multiple values in a table. Values with the same columns are inserted with a single query.
+
+        :param rows: (list of dict) each with (key, value) = (column, value). See BaseDB.insert.
+        """
+        # Group rows by column shape, preserving the order of first appearance
+        shapes = {}
+        for row in rows:
+            shapes.setdefault(tuple(row.keys()), []).append(tuple(row.values()))
+        # Execute one query per shape
+        for columns, values in shapes.items():
+            self.executemany(self._query(('insert', columns), lambda: self._build_insert(columns)), values)
+        if self._cache is not None:
+            ids = set(row.get('id') for row in rows)
+            self._invalidate_(None if None in ids else ids)
+        self._group_write_()
+
+    def _build_insert(self, columns):
+        """Build the SQL insert query of the given columns"""
+        return "insert into {} ({}) values ({})".format(
+            self.name, ', '.join(map(self.dialect.quote, columns)), self.dialect.params(len(columns)))
 
     @staticmethod
-    def _build_where(where):
+    def _where_shape(where):
         """
-        Convert a 'where' dictionary into an sql clause
+        Return a hashable description of a 'where' dictionary. Dictionaries with the same shape build the same SQL
+        clause, and only differ in the values bound to it.
+
+        :param where:  (dict) with (key, value) = (columns, value) in the table.
+        """
+        shape = []
+        for key, value in where.items():
+            if isinstance(value, list):
+                shape.append((key, 'in', len(value)))
+            elif key == '*':
+                shape.append((key, value[0] if isinstance(value, tuple) else value))
+            elif value is None:
+                shape.append((key, 'null'))
+            else:
+                shape.append((key, '='))
+        return tuple(shape)
+
+    @staticmethod
+    def _where_values(where):
+        """
+        Return the values bound to the SQL clause built from a 'where' dictionary, including the 'limit' offset.
+
         :param where:  (dict) with (key, value) = (columns, value) in the table.
-        :return: where_sql, where_values, limit_sql
+        """
+        where_values = []
+        for key, value in where.items():
+            if isinstance(value, list):
+                where_values.extend(value)
+            elif key == '*' and isinstance(value, tuple):
+                where_values.extend(value[1:])
+            elif key == '*' or key == 'rn' or value is None:
+                pass
+            else:
+                where_values.append(value)
+        if 'rn' in where:
+            where_values.append(where['rn'])
+        return where_values
+
+    def _build_where(self, where):
+        """
+        Convert a 'where' dictionary into an sql clause
+        :param where:  (dict) with (key, value) = (columns, value) in the table. The special key '*' holds a literal
+            clause, either as a string or as a tuple (clause, *values) with the values bound to its '?' markers (see
+            Dialect.literal).
+        :return: where_sql, limit_sql. Values are bound to the clauses in the order given by BaseDB._where_values.
         """
         # Build limit
+        d = self.dialect
         if 'rn' in where:
-            limit_sql = 'limit 1 offset {}'.format(where['rn'])
+            limit_sql = 'limit 1 offset {}'.format(d.placeholder)
         else:
             limit_sql = ''
         # Build where
         where_sql = ''
-        where_values = []
         for key, value in where.items():
             if isinstance(value, list):
                 if len(value) == 1:
-                    where_sql += ' and {} = {}'.format(key, value[0])
+                    where_sql += ' and {} = {}'.format(d.quote(key), d.placeholder)
                 else:
-                    where_sql += ' and {} in {}'.format(key, tuple(value))
-            elif key == '*':  # Literal where clause
-                where_sql += ' and {}'.format(value)
+                    where_sql += ' and {} in ({})'.format(d.quote(key), d.params(len(value)))
+            elif key == '*':  # Literal where clause, optionally given as (clause, *values)
+                where_sql += ' and {}'.format(d.literal(value[0] if isinstance(value, tuple) else value))
             elif key == 'rn':  # Ignore
                 pass
             else:
                 if value is None:
-                    where_sql += ' and {} is Null'.format(key)
+                    where_sql += ' and {} is Null'.format(d.quote(key))
                 else:
-                    where_sql += ' and {} = ?'.format(key)
-                    where_values.append(value)
+                    where_sql += ' and {} = {}'.format(d.quote(key), d.placeholder)
         if len(where_sql) > 0:
             where_sql = 'where ' + where_sql[5:]
         # Done
-        return where_sql, where_values, limit_sql
+        return where_sql, limit_sql
 
     def update(self, set, where):
         """
@@ -173,22 +451,26 @@ class BaseDB:
         :param where: (dict) with (key, value) = (columns, value) in <table>. Builds
             the "where" clause of the SQL update query.
         """
+        set_shape = tuple((key, value) if key == '*' else key for key, value in set.items())
+        query = self._query(('update', set_shape, self._where_shape(where)), lambda: self._build_update(set, where))
+        self.execute(query, [value for key, value in set.items() if key != '*'] + self._where_values(where))
+        if self._cache is not None:
+            ids = self._where_ids(where)
+            self._invalidate_(ids if ids is None or 'id' not in set else ids + [set['id']])
+        self._group_write_()
+
+    def _build_update(self, set, where):
+        """Build the SQL update query. See BaseDB.update"""
         # Build set
-        set_sql = ''
-        set_values = []
+        set_sql = []
         for key, value in set.items():
             if key == '*':  # Literal expression
-                set_sql = value
+                set_sql.append(self.dialect.literal(value))
             else:
-                set_sql += ', {} = ?'.format(key)
-                set_values.append(value)
-        if len(set_values) > 0:
-            set_sql = set_sql[2:]
+                set_sql.append('{} = {}'.format(self.dialect.quote(key), self.dialect.placeholder))
         # Build where
-        where_sql, where_values, limit_sql = self._build_where(where)
-        # Update
-        self.execute("update {} set {} {} {}".format(self.name, set_sql, where_sql, limit_sql),
-                     set_values + where_values)
+        where_sql, limit_sql = self._build_where(where)
+        return "update {} set {} {} {}".format(self.name, ', '.join(set_sql), where_sql, limit_sql)
 
     def select(self,  column=[], where={}, order=[]):
         """
@@ -199,6 +481,12 @@ class BaseDB:
             the "where" clause of the SQL select query.
         :param order: (list of str) Names of columns to order the result.
         """
+        query = self._query(('select', tuple(column), self._where_shape(where), tuple(order)),
+                            lambda: self._build_select(column, where, order))
+        return self.execute(query, self._where_values(where))
+
+    def _build_select(self, column, where, order):
+        """Build the SQL select query. See BaseDB.select"""
         # Build select
         if len(column) == 0:
             col_sql = '*'
@@ -207,10 +495,10 @@ class BaseDB:
             for c in column:
                 if not isinstance(c, str):
                     raise TypeError("Selected arguments must be of type 'str'. Found {} instead.".format(type(c)))
-                col_sql += ', {}'.format(c)
+                col_sql += ', {}'.format(self.dialect.quote(c))
             col_sql = col_sql[2:]
         # Build where
-        where_sql, where_values, limit_sql = self._build_where(where)
+        where_sql, limit_sql = self._build_where(where)
         # Build order
         if len(order) == 0:
             order_sql = ''
@@ -219,11 +507,9 @@ class BaseDB:
             for c in order:
                 if not isinstance(c, str):
                     raise TypeError("Selected arguments must be of type 'str'. Found {} instead.".format(type(c)))
-                order_sql += ' {},'.format(c)
+                order_sql += ' {},'.format(self.dialect.quote(c))
             order_sql = order_sql[:-1]
-        # Select
-        return self.execute("select {} from {} {} {} {}".format(col_sql, self.name, where_sql, order_sql, limit_sql),
-                            where_values)
+        return "select {} from {} {} {} {}".format(col_sql, self.name, where_sql, order_sql, limit_sql)
 
     def delete(self, where):
         """
@@ -232,17 +518,156 @@ class BaseDB:
         :param where: (dict) with (key, value) = (columns, value) in <table>. Builds
             the "where" clause of the SQL delete query.
         """
-        # Build where
-        where_sql, where_values, limit_sql = self._build_where(where)
-        # Delete
-        self.execute('delete from {} {} {}'.format(self.name, where_sql, limit_sql), where_values)
+        query = self._query(('delete', self._where_shape(where)),
+                            lambda: 'delete from {} {} {}'.format(self.name, *self._build_where(where)))
+        self.execute(query, self._where_values(where))
+        if self._cache is not None:
+            self._invalidate_(self._where_ids(where))
+        self._group_write_()
+
+    # Group commit
+    # ---------------------------------------------------------------
+
+    def _group_write_(self):
+        """
+        Count a write for the group commit (see 'group_commit' in BaseDB.__init__). Writes made within explicit
+        transactions are committed by the transaction.
+        """
+        if (self.group_commit is None and self.group_interval is None) or self._transaction_level > 0:
+            return
+        group = self._group
+        if group['writes'] == 0:
+            group['start'] = time.monotonic()
+        group['writes'] += 1
+        if group['depth'] == 0:  # Write made outside any operation
+            self._group_commit_()
+
+    def _operation_(self, func, *args, **kwargs):
+        """
+        Run a logical operation made of several writes (see utils.operation). The group commit is only checked once
+        the outermost operation completes, so that groups never hold half-written values.
+
+        :param func: (callable) Called with <args> and <kwargs>
+        :return: Result of <func>
+        """
+        if self.group_commit is None and self.group_interval is None:
+            return func(*args, **kwargs)
+        group = self._group
+        group['depth'] += 1
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            group['depth'] -= 1
+        if group['depth'] == 0:
+            self._group_commit_()
+        return result
+
+    def _group_commit_(self):
+        """Commit the group of writes if it is full or old enough"""
+        group = self._group
+        if group['writes'] == 0 or self._transaction_level > 0:
+            return
+        if (self.group_commit is not None and group['writes'] >= self.group_commit) or \
+                (self.group_interval is not None and
+                 (time.monotonic() - group['start']) * 1000 >= self.group_interval):
+            self.commit()
+
+    def _group_reset_(self):
+        """Start a new group of writes. Called on commit and rollback"""
+        self._group['writes'] = 0
+
+    def flush(self):
+        """Commit the writes pending of a group commit"""
+        if self._group['writes'] > 0:
+            self.commit()
+        return self
+
+    # Object cache
+    # ---------------------------------------------------------------
+
+    def cache_info(self):
+        """
+        :return: (dict) Hits, misses, evictions, size and maximum size of the object cache, or None if the cache is
+            disabled (see 'cache_size' in BaseDB.__init__).
+        """
+        return None if self._cache is None else self._cache.info()
+
+    def _invalidate_(self, ids=None):
+        """
+        Discard the cached lookups holding rows of the given ids. Called after every write.
+
+        :param ids: (iterable of int) Ids written to. If None, discard every cached lookup.
+        """
+        if self._cache is not None:
+            if ids is None:
+                self._cache.clear()
+            else:
+                self._cache.invalidate(ids)
+
+    def _check_cache_(self):
+        """
+        Discard the object cache if the database was changed by another connection. Databases which cannot detect
+        external changes keep the cache, which is then only valid while this handler is the only writer.
+        """
+        pass
+
+    @staticmethod
+    def _where_ids(where):
+        """Return the list of ids selected by a 'where' dictionary, or None if it does not select by id"""
+        if 'id' not in where:
+            return None
+        elif isinstance(where['id'], list):
+            return list(where['id'])
+        else:
+            return [where['id']]
+
+    def _select_item_(self, where):
+        """Select the rows of BaseDB.__getitem__, through the object cache if it is enabled"""
+        key = None if self._cache is None else self._cache.key(where)
+        if key is None:
+            return self.select(where=where, order=('id', 'ind', 'key'))
+        self._check_cache_()
+        rows = self._cache.get(key)
+        if rows is None:
+            rows = self.select(where=where, order=('id', 'ind', 'key'))
+            if len(rows) > 0:
+                self._cache.put(key, rows)
+        return rows
 
     def transaction(self, *args, **kwargs):
-        """Return a database transaction class"""
-        # Build database transaction class
-        class DBTransaction(BaseTransaction, self.__class__):
-            pass
-        return DBTransaction(self, *args, **kwargs)
+        """Return a database transaction (see BaseTransaction)"""
+        return self._transaction_class_()(self, *args, **kwargs)
+
+    @classmethod
+    def _transaction_class_(cls):
+        """Database transaction class of this database class. Built once, on first use"""
+        if '_transaction_cls' not in cls.__dict__:
+            cls._transaction_cls = type('{}Transaction'.format(cls.__name__), (BaseTransaction, cls), {})
+        return cls.__dict__['_transaction_cls']
+
+    def stream(self, query, pars=(), size=None):
+        """
+        Execute an sql query and yield its rows. Rows are fetched in batches through a dedicated cursor, so that
+        large results are not held in memory at once.
+
+        :param query: (str) SQL query
+        :param pars: (list) Parameters required by the SQL query.
+        :param size: (int) Number of rows fetched at a time. Defaults to BaseDB.stream_size.
+        """
+        cursor = self._cursor_()
+        try:
+            cursor.execute(query, pars)
+            while True:
+                rows = cursor.fetchmany(size or self.stream_size)
+                if len(rows) == 0:
+                    break
+                yield from rows
+        finally:
+            cursor.close()
+
+    def _cursor_(self):
+        """Return a new cursor of the database connection (see BaseDB.stream)"""
+        return self._conx.cursor()
 
     def commit(self):
         raise NotImplemented
@@ -250,17 +675,26 @@ class BaseDB:
     def rollback(self):
         raise NotImplemented
 
-    def exists(self):
+    def exists(self, table=None):
+        """
+        :param table: (str) Table name. Defaults to the database table.
+        :return: True if the table exists
+        """
         raise NotImplemented
 
-    def free_id(self, consecutive=True):
+    def free_id(self, consecutive=False, n=1):
         """
         Return an available id
 
-        :param consecutive: (bool) If true, find the smallest id available.
-        :return: (int) id
+        :param consecutive: (bool) If true, find the smallest id available by searching for gaps between the ids in
+            use. This is slow on large databases. Otherwise, reserve the next id of the sequence table, which takes
+            constant time (see BaseDB._reserve).
+        :param n: (int) Number of consecutive ids to reserve from the sequence table.
+        :return: (int) id (the first of the reserved ids)
         """
-        if consecutive:
+        if not consecutive:
+            return self._reserve('id', n)
+        else:
             id = self.execute(
                 'with roots as (select id from {} where root = 1) '.format(self.name) +
                 'select a.id + 1 ' 
@@ -270,34 +704,49 @@ class BaseDB:
                 'where b.id is NULL '
                 'limit 1 '
             )
-            if len(id) == 0:
-                return 0
-            else:
-                return id[0][0]
-        else:
-            return self.execute("select coalesce(max(id) + 1, 0) from {} where root = 1".format(self.name))[0][0]
+            id = 0 if len(id) == 0 else id[0][0]
+            # Keep the sequence ahead of the returned id
+            self.execute('update {} set value = case when value > {p} then value else {p} end where name = {p}'.format(
+                self._seq_name, p=self.dialect.placeholder), (id, id + 1, 'id'))
+            return id
 
     def free_name(self, prefix=''):
         """
         Return an available name
 
         :param prefix: (str) A name prefix
-        :return: (str) A free randomly generated object name, with the specified prefix.
+        :return: (str) A free object name, with the specified prefix (see BaseDB.free_names).
+        """
+        return self.free_names(1, prefix)[0]
+
+    def free_names(self, n, prefix=''):
+        """
+        Return n available names, reserved from the name sequence (see BaseDB._reserve).
+
+        Names have the form '<prefix>$<number>'. Reserved names already in use (i.e. chosen by the user) are skipped.
+
+        :param n: (int) Number of names
+        :param prefix: (str) A name prefix
+        :return: (list of str) Free object names, with the specified prefix.
+        """
+        names = []
+        while len(names) < n:
+            first = self._reserve('name', n - len(names))
+            new = ['{}${}'.format(prefix, i) for i in range(first, first + n - len(names))]
+            used = {r[0] for r in self.select(column=('name', ), where={'name': new})}
+            names += [name for name in new if name not in used]
+        return names
+
+    def _free_ids(self, block=1024):
         """
-        name_len = 3
+        Generator of available ids for variables inserted together. Ids are reserved from the sequence table in
+        blocks of growing size, up to <block> ids. Ids left unused when the generator is discarded are not reused.
+        """
+        n = 1
         while True:
-            name = prefix + utils.random_str(name_len)
-            name_count = self.execute(
-                'select count(*) '
-                'from {} '.format(self.name) +
-                'where name = ? '
-                'limit 1 '
-                , (name,))
-            if name_count[0][0] == 0:
-                break
-            else:
-                name_len += 1
-        return name
+            id = self.free_id(n=n)
+            yield from range(id, id + n)
+            n = min(2 * n, block)
 
     # with
     # ---------------------------------------------------------------
@@ -315,8 +764,8 @@ class BaseDB:
 
     def __getobject__(self, where):
         # Build where
-        where_sql, where_values, limit_sql = self._build_where(where)
-        rows = self.execute('select * from [db] {} {}'.format(where_sql, limit_sql), where_values)
+        where_sql, limit_sql = self._build_where(where)
+        rows = self.execute('select * from [db] {} {}'.format(where_sql, limit_sql), self._where_values(where))
         raise NotImplementedError
 
     def __norm_item__(self, item):
@@ -345,7 +794,7 @@ class BaseDB:
             inds = []
         else:  # Single variable selected. Return root row. No keys and indices needed
             item['root'] = True
-        row = self.select(where=item, order=('id', 'ind', 'key'))
+        row = self._select_item_(item)
         if len(row) == 0:
             raise ex.VariableError('in database {}: variable {} not found'.format(self.name, item))
         values = []
@@ -353,20 +802,25 @@ class BaseDB:
             if item_type == dict:
                 keys.append(row_n[3])
                 inds.append(row_n[4])
-            if row_n[2] in py2sql.py2sql_single_str:
-                values.append(py2sql.py2sql_single_str[row_n[2]](db=self, row=row_n))
-            elif row_n[2] in py2sql.py2sql_nested_str:
-                if row_n[9]:
-                    values.append(self[row_n[9]])
-                else:
-                    values.append(py2sql.py2sql_nested_str[row_n[2]](db=self, row=row_n))
+            if row_n[2] in py2sql.py2sql_nested_str and row_n[9]:
+                values.append(self[row_n[9]])
             else:
-                raise TypeError('Type {}, non-native to SQLebra, is not supported'.format(row[2]))
+                values.append(self._row2object_(row_n))
         if item_type == dict:
             return keys, inds, values
         else:
             return values[0]
 
+    def _row2object_(self, row):
+        """SQLebra object of a row. Rows referencing a nested value (child_id) must be resolved by the caller"""
+        if row[2] in py2sql.py2sql_single_str:
+            return py2sql.py2sql_single_str[row[2]](db=self, row=row)
+        elif row[2] in py2sql.py2sql_nested_str:
+            return py2sql.py2sql_nested_str[row[2]](db=self, row=row)
+        else:
+            raise TypeError('Type {}, non-native to SQLebra, is not supported'.format(row[2]))
+
+    @utils.operation
     def __setitem__(self, item, value):
         item_type = type(item)
         item = self.__norm_item__(item)
@@ -388,37 +842,243 @@ class BaseDB:
         if 'root' not in item:
             item['root'] = True
         # Autodetect type
+        if type(value) in py2sql.py2sql_single or type(value) in py2sql.py2sql_nested:
+            # Build all rows in memory and insert them together
+            rows = []
+            self._value2rows(item, value, rows, self._free_ids())
+            self.insert_many(rows)
+        elif type(value) in py2sql.single or type(value) in py2sql.nested:
+            if value.dbfile != self.db:
+                value = type(value)(db_file=self.db, name=value.name).set(value.x)
+        else:
+            raise TypeError('Type {} not supported by SQLebra'.format(type(value)))
+
+    def _value2rows(self, item, value, rows, ids, shared=None):
+        """
+        Convert a python value into the rows storing it as a new variable.
+
+        :param item: (dict) with (key, value) = (column, value) identifying the new variable.
+        :param value: Python value
+        :param rows: (list) Rows are appended to this list, ready for BaseDB.insert_many.
+        :param ids: (iterator) Available ids for nested values (see BaseDB._free_ids)
+        :param shared: (dict) Ids of the nested values built by this call, by content hash. Used if BaseDB.dedup.
+        :return: (int) Content hash of the value (see BaseDB.content_hash)
+        """
+        if self.dedup and shared is None:
+            shared = {}
         if type(value) in py2sql.py2sql_single:
-            item = {**item, **py2sql.py2sql_single[type(value)].value2row(value)}
-            # Insert variable
-            self.insert(item)
+            sqlclass = py2sql.py2sql_single[type(value)]
+            h = sqlclass.content_hash(value)
+            rows.append({**item, **sqlclass.value2row(value), 'hash': h})
+            return h
         elif type(value) in py2sql.py2sql_nested:
+            sqlclass = py2sql.py2sql_nested[type(value)]
+            layout = self.layouts.get(sqlclass.pyclass.__name__)
+            options = self.layout_options.get(sqlclass.pyclass.__name__, {})
             if item['root']:
-                # Convert value to row, insert variable and set value
-                item = {**item, **py2sql.py2sql_nested[type(value)].value2row(value)}
-                self.insert(item)
-                self[item][2][0].py = value
+                heads = [{**item, **sqlclass.value2row(value, layout)}]
+                id = item['id']
             else:
+                shared_id = self._shared_id_(value, sqlclass, shared) if self.dedup else None
+                if shared_id is not None:  # Reference the stored copy of the value
+                    h, id = shared_id
+                    rows.append({**item, 'child_id': id, **sqlclass.value2row(value), 'hash': h})
+                    return h
                 # Insert new variable as children
-                item['child_id'] = self.free_id()
-                # Convert value to row and insert variable
-                item = {**item, **py2sql.py2sql_nested[type(value)].value2row(value)}
-                self.insert(item)
-                # Insert new nested value in the database
-                nested_item = {
-                    'id': item['child_id'],
-                    'name': item['name'],
-                    'root': True,
-                    'user_defined': False
-                }
-                self[nested_item] = value
+                id = next(ids)
+                heads = [{**item, 'child_id': id, **sqlclass.value2row(value)},
+                         {'id': id, 'name': item.get('name'), 'root': True, 'user_defined': False,
+                          **sqlclass.value2row(value, layout)}]
+            rows.extend(heads)
+            # Nested values
+            hashes = []
+            for item_n, value_n in sqlclass.value2items(item.get('name'), value, layout, **options):
+                hashes.append((item_n.get(sqlclass.col_item), self._value2rows(
+                    {'id': id, 'root': False, 'user_defined': False, **item_n}, value_n, rows, ids, shared)))
+            # The hash of a nested value is known once its items are built
+            h = sqlclass.content_hash(hashes)
+            for row in heads:
+                row['hash'] = h
+            if self.dedup and not item['root'] and h != utils.NO_HASH:
+                shared[h] = id
+            return h
+        else:
+            raise TypeError('Type {} not supported by SQLebra'.format(type(value)))
 
-        elif type(value) in py2sql.single or type(value) in py2sql.nested:
-            if value.dbfile != self.db:
-                value = type(value)(db_file=self.db, name=value.name).set(value.x)
+    # Content hashes
+    # ---------------------------------------------------------------
+
+    def content_hash(self, value):
+        """
+        Structural content hash of a python value, as stored in the 'hash' column of the rows holding it. Equal values
+        of the same type have equal hashes, regardless of their storage layout. Nested items are searched by value
+        with an indexed lookup of their hash (e.g. list_.index, list_.count).
+
+        :param value: Python value
+        :return: (int) utils.NO_HASH if the value does not support one (e.g. numpy arrays)
+        """
+        if type(value) in py2sql.py2sql_single:
+            return py2sql.py2sql_single[type(value)].content_hash(value)
+        elif type(value) in py2sql.py2sql_nested:
+            sqlclass = py2sql.py2sql_nested[type(value)]
+            return sqlclass.content_hash((item.get(sqlclass.col_item), self.content_hash(value_n))
+                                         for item, value_n in sqlclass.value2items(None, value))
         else:
             raise TypeError('Type {} not supported by SQLebra'.format(type(value)))
 
+    def _shared_id_(self, value, sqlclass, shared):
+        """
+        Look up the stored copy of a nested value, built by the current call of BaseDB._value2rows or already in the
+        database (see BaseDB.dedup).
+
+        :return: (tuple) (hash, id) of the stored copy, or None if there is none.
+        """
+        h = self.content_hash(value)
+        if h == utils.NO_HASH:
+            return None
+        if h not in shared:
+            ids = self.select(column=('id', ), where={'hash': h, 'root': True, 'user_defined': False,
+                                                      'class': sqlclass.pyclass.__name__, 'rn': 0})
+            if len(ids) == 0:
+                return None
+            shared[h] = ids[0][0]
+        return h, shared[h]
+
+    def _nested_write_(self, id):
+        """
+        Prepare a write to the items of a nested variable: check that neither the variable nor any variable containing
+        it is shared by several items (only in files which may hold shared values, see BaseDB._check_shared_), and
+        discard their content hashes. Discarded hashes are computed again when next needed (see BaseDB.rehash).
+
+        :param id: (int) Variable id
+        """
+        if self._shared_values:
+            query = self._query(('shared', ), lambda: (
+                'with recursive up(id) as ('
+                'select {p} union select t.id from {t} t join up on t.child_id = up.id'
+                ') '
+                'select child_id from {t} where child_id in (select id from up) '
+                'group by child_id having count(*) > 1').format(t=self.name, p=self.dialect.placeholder))
+            shared = self.execute(query, (id, ))
+            if len(shared) > 0:
+                raise ex.SharedValueError('in database {}: variable {} is shared by several items, and cannot be '
+                                          'written to. Replace the items holding it instead.'.format(
+                                              self.name, shared[0][0]))
+        # Written as an update statement (rather than 'with ... update'), so that it is recognised as a write
+        query = self._query(('stale', ), lambda: self.dialect.update_from(
+            self.name, 'hash = NULL',
+            'with recursive up(id) as ('
+            'select {p} union select t.id from {t} t join up on t.child_id = up.id'
+            ') select id from up'.format(t=self.name, p=self.dialect.placeholder),
+            'up', '{t}.hash is not NULL and '
+                  '(({t}.id = up.id and {t}.root = 1) or {t}.child_id = up.id)'.format(t=self.name)))
+        self.execute(query, (id, ))
+        # The object cache is kept: content hashes are not part of SQLebra objects
+        self._group_write_()
+
+    def rehash(self, id):
+        """
+        Compute the content hashes missing from a nested variable and its nested values, i.e. discarded by a write or
+        never stored (variables written by older versions of SQLebra).
+
+        :param id: (int) Variable id
+        :return: (int) Content hash of the variable
+        """
+        nested, single = {}, []
+        h = self._tree_hash_(self.tree(id), id, nested, single)
+        if len(nested) > 0:
+            # The hash of a nested value is also stored in the item rows referencing it
+            query = self._query(('rehash', ), lambda: (
+                'update {t} set hash = {p} where (id = {p} and root = 1) or child_id = {p}').format(
+                t=self.name, p=self.dialect.placeholder))
+            self.executemany(query, [(h_n, id_n, id_n) for id_n, h_n in nested.items()])
+            self._group_write_()
+        for h_n, row in single:
+            self.update(set={'hash': h_n}, where={'id': row[0], 'root': row[10], 'key': row[3], 'ind': row[4]})
+        return h
+
+    def _tree_hash_(self, tree, id, nested, single):
+        """
+        Content hash of a nested variable, built from the rows returned by BaseDB.tree. Stored hashes are trusted:
+        writes discard the hash of every variable containing the written one (see BaseDB._nested_write_).
+
+        :param nested: (dict) Computed hashes of nested variables, by id
+        :param single: (list) Computed hashes of single values, as (hash, row) tuples
+        """
+        root, rows = tree[id][0], tree[id][1:]
+        if root[13] is not None:
+            return root[13]
+        if id not in nested:
+            sqlclass = py2sql.py2sql_nested_str[root[2]]
+            col = var.COL_DICT[sqlclass.col_item]
+            nested[id] = sqlclass.content_hash((row[col], self._row_hash_(tree, row, nested, single)) for row in rows)
+        return nested[id]
+
+    def _row_hash_(self, tree, row, nested, single):
+        """Content hash of a nested item row (see BaseDB._tree_hash_)"""
+        if row[13] is not None:
+            return row[13]
+        elif row[9] is not None:
+            return self._tree_hash_(tree, row[9], nested, single)
+        else:
+            sqlclass = py2sql.py2sql_single_str[row[2]]
+            h = sqlclass.content_hash(sqlclass.row2value(row))
+            single.append((h, row))
+            return h
+
+    def tree(self, id=None):
+        """
+        Select the rows of a variable and all its nested values with a single recursive query.
+
+        :param id: (int) Variable id. If None, select all user defined variables.
+        :return: (dict) with (key, value) = (id, rows). Rows are ordered by 'ind' and 'key', with the root row first.
+        """
+        if id is None:
+            seed_sql = 'select id from {} where root = 1 and user_defined = 1'.format(self.name)
+            pars = []
+        else:
+            seed_sql = 'select {}'.format(self.dialect.placeholder)
+            pars = [id]
+        rows = self.execute(
+            'with recursive tree(id) as ('
+            '{seed} '
+            'union '
+            'select t.child_id from {name} t join tree on t.id = tree.id where t.child_id is not NULL'
+            ') '
+            'select * from {name} where id in (select id from tree) order by id, root desc, ind, {key}'.format(
+                seed=seed_sql, name=self.name, key=self.dialect.quote('key')), pars)
+        tree = {}
+        for row in rows:
+            tree.setdefault(row[0], []).append(row)
+        return tree
+
+    def tree2py(self, tree, id):
+        """
+        Python value of a variable, built from the rows returned by BaseDB.tree
+
+        :param tree: (dict) Result of BaseDB.tree
+        :param id: (int) Variable id
+        :return: Python value
+        """
+        if id not in tree:
+            raise ex.VariableError('in database {}: variable {} not found'.format(self.name, id))
+        root, rows = tree[id][0], tree[id][1:]
+        if root[2] in py2sql.py2sql_single_str:
+            return py2sql.py2sql_single_str[root[2]].row2value(root)
+        elif root[2] in py2sql.py2sql_nested_str:
+            return py2sql.py2sql_nested_str[root[2]].rows2value(root, rows, lambda row: self._row2py(tree, row))
+        else:
+            raise TypeError('Type {}, non-native to SQLebra, is not supported'.format(root[2]))
+
+    def _row2py(self, tree, row):
+        """Python value of a nested item row, resolving references to nested values within <tree>"""
+        if row[9] is not None:
+            return self.tree2py(tree, row[9])
+        elif row[2] in py2sql.py2sql_single_str:
+            return py2sql.py2sql_single_str[row[2]].row2value(row)
+        else:
+            raise TypeError('Type {}, non-native to SQLebra, is not supported'.format(row[2]))
+
     def __len__(self):
         return self.execute('select count(*) from {} where user_defined = 1 and root = 1'.format(self.name))[0][0]
 
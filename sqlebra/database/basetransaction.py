@@ -1,6 +1,9 @@
-
 class BaseTransaction:
-    """Database transaction class handling nested transactions"""
+    """
+    Database transaction class handling nested transactions. The outermost transaction begins and commits (or rolls
+    back) the database transaction. Nested transactions are savepoints, so that a failure only rolls back the
+    changes made within the nested transaction.
+    """
 
     def __init__(self, db):
         self.db = db
@@ -12,19 +15,33 @@ class BaseTransaction:
         """Return a database transaction"""
         return self
 
+    @staticmethod
+    def _savepoint_(level):
+        """Name of the savepoint of a nested transaction level"""
+        return 'sqlebra_{}'.format(level)
+
     # with
     # ---------------------------------------------------------------
 
     def __enter__(self):
         self.db._transaction_level += 1
         if self.db._transaction_level == 1:
+            self.db.flush()  # Writes pending of a group commit
             self.db.execute('begin')
+        else:
+            self.db.execute('savepoint {}'.format(self._savepoint_(self.db._transaction_level)))
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
+        level = self.db._transaction_level
         self.db._transaction_level -= 1
-        if exc_type:
-            self.rollback()
-            exc_type(exc_val, exc_tb)
-        elif self._transaction_level == 0:
-            self.commit()
+        if level == 1:
+            if exc_type:
+                self.rollback()
+            else:
+                self.commit()
+        else:
+            if exc_type:
+                self.db.execute('rollback to savepoint {}'.format(self._savepoint_(level)))
+                self.db._invalidate_()
+            self.db.execute('release savepoint {}'.format(self._savepoint_(level)))
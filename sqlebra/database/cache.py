@@ -0,0 +1,76 @@
+import threading
+from sqlebra import utils
+
+
+class RowCache:
+    """
+    Cache of the rows selected by BaseDB.__getitem__. Entries are indexed by the ids of their rows, so that writes
+    invalidate only the entries of the ids they touch.
+    """
+
+    def __init__(self, maxsize):
+        """
+        :param maxsize: (int) Maximum number of cached selections
+        """
+        self._lru = utils.LRUCache(maxsize, on_evict=self._unindex_)
+        self._ids = {}  # Cache keys by id
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def key(where):
+        """
+        Cache key of a 'where' dictionary (see BaseDB.select), or None if the selection cannot be cached. Only
+        selections by id or by name are cached: other selections (e.g. all user defined variables) may gain rows on
+        any insert, which only invalidates the entries of the inserted id.
+        """
+        if 'id' not in where and 'name' not in where:
+            return None
+        key = tuple(where.items())
+        try:
+            hash(key)
+        except TypeError:  # e.g. lists of values
+            return None
+        return key
+
+    def get(self, key):
+        """Return the cached rows of <key>, or None"""
+        return self._lru.get(key)
+
+    def put(self, key, rows):
+        """Cache the rows selected by <key>"""
+        with self._lock:
+            for id in set(row[0] for row in rows):
+                self._ids.setdefault(id, set()).add(key)
+            self._lru[key] = rows
+
+    def invalidate(self, ids):
+        """
+        Discard the entries holding rows of the given ids
+
+        :param ids: (iterable of int) Ids written to
+        """
+        with self._lock:
+            for id in ids:
+                for key in self._ids.pop(id, ()):
+                    self._lru.pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._ids.clear()
+            self._lru.clear()
+
+    def info(self):
+        """Return a dictionary with the cache statistics (see LRUCache.info)"""
+        return self._lru.info()
+
+    def __len__(self):
+        return len(self._lru)
+
+    def _unindex_(self, key, rows):
+        with self._lock:
+            for id in set(row[0] for row in rows):
+                keys = self._ids.get(id)
+                if keys is not None:
+                    keys.discard(key)
+                    if len(keys) == 0:
+                        del self._ids[id]
@@ -0,0 +1,116 @@
+class Dialect:
+    """
+    SQL syntax of a database engine. BaseDB builds its queries through a dialect, so that each engine receives
+    native SQL and queries need no rewriting when executed.
+    """
+
+    # Parameter marker
+    placeholder = '?'
+    # Character used to quote identifiers
+    quote_char = '"'
+    # Column names which are reserved words, and must be quoted
+    reserved = frozenset()
+    # Engine specific SQL types, by generic SQL type (see BaseDB._columns)
+    types = {}
+
+    def params(self, n):
+        """Return a comma separated list of n parameter markers"""
+        return ', '.join([self.placeholder] * n)
+
+    def quote(self, name):
+        """Quote an identifier if it is a reserved word"""
+        if name in self.reserved:
+            return '{q}{}{q}'.format(name, q=self.quote_char)
+        else:
+            return name
+
+    def literal(self, clause):
+        """
+        Adapt a literal clause written with '?' parameter markers (see BaseDB._build_where).
+
+        :param clause: (str) SQL clause. Reserved words must be quoted with Dialect.quote.
+        """
+        return clause.replace('?', self.placeholder)
+
+    def mod(self, a, b):
+        """Return an SQL expression of the remainder of a divided by b"""
+        return '(({}) % ({}))'.format(a, b)
+
+    def type(self, sql_type):
+        """Return the engine type of a generic SQL type"""
+        return self.types.get(sql_type, sql_type)
+
+    def index_column(self, column, sql_type):
+        """
+        Column expression used in an index definition
+
+        :param column: (str) Column name, optionally followed by ' desc'
+        :param sql_type: (str) Generic SQL type of the column
+        """
+        name, _, order = column.partition(' ')
+        return ' '.join(filter(None, (self.quote(name), order)))
+
+    def upsert(self, table, columns, keys, update=()):
+        """
+        Return a query inserting a row, or updating the existing row with the same keys.
+
+        :param table: (str) Table name
+        :param columns: (tuple of str) Inserted columns
+        :param keys: (tuple of str) Columns of the unique key
+        :param update: (tuple of str) Columns updated when the row already exists. If empty, the existing row is
+            left untouched.
+        """
+        sql = 'insert into {} ({}) values ({}) on conflict ({}) '.format(
+            table, ', '.join(map(self.quote, columns)), self.params(len(columns)), ', '.join(map(self.quote, keys)))
+        if len(update) == 0:
+            return sql + 'do nothing'
+        else:
+            return sql + 'do update set ' + ', '.join('{c} = excluded.{c}'.format(c=self.quote(c)) for c in update)
+
+    def update_from(self, table, set_sql, subquery, alias, on):
+        """
+        Return a query updating the rows of a table joined to a subquery. Parameters of the query are bound in the
+        order: <subquery>, <on>.
+
+        :param table: (str) Updated table
+        :param set_sql: (str) "set" clause, which may refer to the columns of the subquery. Must not hold parameters.
+        :param subquery: (str) Select query
+        :param alias: (str) Name of the subquery
+        :param on: (str) Join condition. Columns of <table> must be qualified with its name.
+        """
+        return 'update {} set {} from ({}) as {} where {}'.format(table, set_sql, subquery, alias, on)
+
+
+class SQLiteDialect(Dialect):
+    """SQL syntax of SQLite"""
+
+
+class MySQLDialect(Dialect):
+    """SQL syntax of MySQL"""
+
+    placeholder = '%s'
+    quote_char = '`'
+    reserved = frozenset(('key', ))
+    # BLOB columns are limited to 64KB in MySQL
+    types = {'BLOB': 'LONGBLOB'}
+
+    def index_column(self, column, sql_type):
+        # TEXT columns can only be indexed by a prefix in MySQL
+        if sql_type == 'TEXT':
+            return '{}(255)'.format(self.quote(column))
+        else:
+            return super(MySQLDialect, self).index_column(column, sql_type)
+
+    def mod(self, a, b):
+        return 'mod({}, {})'.format(a, b)
+
+    def update_from(self, table, set_sql, subquery, alias, on):
+        return 'update {} join ({}) as {} on {} set {}'.format(table, subquery, alias, on, set_sql)
+
+    def upsert(self, table, columns, keys, update=()):
+        if len(update) == 0:
+            sql = 'insert ignore into {} ({}) values ({})'
+        else:
+            sql = 'insert into {} ({}) values ({}) on duplicate key update ' + \
+                  ', '.join('{c} = values({c})'.format(c=self.quote(c)) for c in update)
+        return sql.format(table, ', '.join(map(self.quote, columns)), self.params(len(columns)))
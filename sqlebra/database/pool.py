@@ -0,0 +1,92 @@
+import queue
+import threading
+from sqlebra import exceptions as ex
+
+
+class ConnectionPool:
+    """
+    Thread safe pool of database connections. Connections are created on demand, up to the pool size, and reused
+    once released.
+    """
+
+    def __init__(self, connect, size=5, check=None, reset=None, timeout=None):
+        """
+        :param connect: (callable) Return a new connection, ready to be used.
+        :param size: (int) Maximum number of connections open at the same time.
+        :param check: (callable) Health check. Called with an idle connection before handing it out, and returns
+            False if the connection is no longer usable. Unusable connections are closed and replaced.
+        :param reset: (callable) Called with a connection when it is released, to leave it in a clean state (e.g.
+            rollback any pending transaction).
+        :param timeout: (float) Seconds to wait for a connection when all of them are in use. None waits forever.
+        """
+        if size < 1:
+            raise ValueError('Pool size must be a positive integer. Found {} instead.'.format(size))
+        self.size = size
+        self.timeout = timeout
+        self._connect = connect
+        self._check = check
+        self._reset = reset
+        self._idle = queue.LifoQueue()  # Most recently used connections first
+        self._slots = threading.BoundedSemaphore(size)  # One slot per open connection
+        self._closed = False
+
+    def acquire(self):
+        """Return a connection from the pool, opening a new one if none is idle"""
+        if self._closed:
+            raise ex.ConnectionError('Connection pool closed')
+        if not self._slots.acquire(timeout=self.timeout):
+            raise ex.ConnectionError('No connection available after {} seconds'.format(self.timeout))
+        try:
+            while True:
+                try:
+                    conx = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._connect()
+                if self._check is None or self._healthy(conx):
+                    return conx
+                self._close(conx)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, conx):
+        """Return a connection to the pool"""
+        try:
+            if self._reset is not None:
+                self._reset(conx)
+        except Exception:
+            self._close(conx)
+        else:
+            if self._closed:
+                self._close(conx)
+            else:
+                self._idle.put(conx)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        """Close idle connections. Connections in use are closed when released."""
+        self._closed = True
+        while True:
+            try:
+                self._close(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+    @property
+    def idle(self):
+        """Number of idle connections"""
+        return self._idle.qsize()
+
+    def _healthy(self, conx):
+        try:
+            return self._check(conx)
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close(conx):
+        try:
+            conx.close()
+        except Exception:
+            pass
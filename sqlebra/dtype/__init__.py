@@ -3,6 +3,7 @@ from .none_type_ import NoneType_
 from .int_ import int_
 from .float_ import float_
 from .str_ import str_
+from .bytes_ import bytes_
 from .list_ import list_
 from .dict_ import dict_
 from .tuple_ import tuple_
@@ -16,7 +16,7 @@ class bool_(Single):
     def py(self, x):
         if not isinstance(x, self.pyclass):
             x = self.pyclass(x)
-        self.db.update(set={self.col_val: x}, where={'id': self.id})
+        Single.py.fset(self, x)
 
     @classmethod
     def row2value(cls, row):
@@ -0,0 +1,27 @@
+from ..object.single import Single
+import builtins
+
+
+class bytes_(Single):
+    """SQLobject of type bytes"""
+
+    pyclass = builtins.bytes
+    col_val = 'blob_val'
+
+    @property
+    def py(self):
+        x = super(bytes_, self).py
+        # Some drivers return binary values as bytearray
+        return x if x is None else builtins.bytes(x)
+
+    @py.setter
+    def py(self, x):
+        Single.py.fset(self, x)
+
+    @classmethod
+    def row2value(cls, row):
+        x = super(bytes_, cls).row2value(row)
+        return x if x is None else builtins.bytes(x)
+
+    def __len__(self):
+        return len(self.py)
@@ -1,6 +1,7 @@
 from ..object.nested import Nested
 import builtins
 from sqlebra import exceptions as ex
+from sqlebra import utils
 
 
 class dict_(Nested):
@@ -11,39 +12,49 @@ class dict_(Nested):
 
     @property
     def py(self):
-        x = {}
-        try:
-            rows = self.db[{'id': self.id, '*': 'root = 0'}]
-        except ex.VariableError:  # Empty list
-            # Possibly an empty list. Retrieve root to assert
-            self.db[{'id': self.id, '*': 'root = 1'}]
-        else:
-            for key, _, val in zip(*rows):
-                x[key] = val.py
-        return x
+        return Nested.py.fget(self)
 
     @py.setter
+    @utils.operation
     def py(self, x):
         if not isinstance(x, self.pyclass):
             raise TypeError('{} expects a value of type {}. Found type {} instead'.format(
                 type(self), self.pyclass, type(x)))
+        self.db._nested_write_(self.id)
         # Empty current
-        self.clear()
+        self._clear_()
         # Insert new values
-        value_item = {'id': self.id, 'root': False, 'user_defined': False}
+        self._insert_items_(x)
+
+    @classmethod
+    def content_hash(cls, hashes):
+        """Items are hashed with their keys, regardless of their order (see Nested.content_hash)"""
+        hashes = sorted(hashes)
+        if any(h == utils.NO_HASH for key, h in hashes):
+            return utils.NO_HASH
+        return utils.content_hash(cls.pyclass.__name__, repr(hashes))
+
+    @classmethod
+    def rows2value(cls, root, rows, row2value):
+        return {row[3]: row2value(row) for row in rows}
+
+    @classmethod
+    def value2items(cls, name, x, layout=None, **options):
         for key, value in x.items():
-            value_item['name'] = self._nameitem_(key)
-            value_item[self.col_item] = key
-            self.db[value_item.copy()] = value
+            yield {'name': cls._name_(name, key), cls.col_item: key}, value
 
     def __getitem__(self, item):
-        x = super(dict_, self).__getitem__(self._check_item_(item))[2]
-        if isinstance(item, str):
-            return x[0]
-        else:
-            return x
+        if not isinstance(item, str):
+            raise TypeError("'{}' only supports 'str' keys. Found '{}' instead".format(type(self), type(item)))
+        # A single lookup, rather than checking the key first
+        try:
+            return super(dict_, self).__getitem__(item)[2][0]
+        except ex.VariableError:
+            raise KeyError("Key '{}' not found.".format(item))
 
+    @utils.operation
     def __setitem__(self, key, value):
+        self.db._nested_write_(self.id)
         try:
             item = self._check_item_(key)
         except KeyError:  # Add new key
@@ -57,9 +68,9 @@ class dict_(Nested):
             row = self.db[{'id': self.id, self.col_item: item}][2][0]
             try:
                 row.py = value
-            except TypeError:
-                row.delete()
+            except (TypeError, ex.SharedValueError):
                 self.db.delete(where={'id': self.id, self.col_item: key})
+                row.delete()
                 self[key] = value
 
     def _check_item_(self, item):
@@ -80,7 +91,7 @@ class dict_(Nested):
             return ex.CorruptedDatabase("Multiple values found for key '{}' of object {}".format(item, self.sql_info))
 
     def __iter__(self):
-        return self.keys()
+        return iter(self.keys())
 
     def keys(self):
         return dict_keys(self)
@@ -91,18 +102,20 @@ class dict_(Nested):
     def items(self):
         return dict_items(self)
 
+    @utils.operation
     def pop(self, key):
         try:
             item = self._check_item_(key)
         except KeyError:
             return None
         else:
+            self.db._nested_write_(self.id)
             # Retrieve row
             row = self.db[{'id': self.id, self.col_item: item}][2][0]
             # Retrieve value and delete key
             row_py = row.py
-            row.delete()
             self.db.delete(where={'id': self.id, self.col_item: key})
+            row.delete()
 
 
 class dict_keys:
@@ -110,20 +123,17 @@ class dict_keys:
 
     def __init__(self, x):
         self.x = x
-        self.current = -1
-        self.high = len(self.x)
 
     def __iter__(self):
-        self.current = -1
-        return self
+        db = self.x.db
+        query = db._query(('dict_keys', ), lambda: (
+            'select {key} from {t} where id = {p} and root = 0 order by {key}').format(
+            key=db.dialect.quote(self.x.col_item), t=db.name, p=db.dialect.placeholder))
+        for row in db.stream(query, (self.x.id, )):
+            yield row[0]
 
-    def __next__(self):
-        self.current += 1
-        if self.current < self.high:
-            return self.x.db.select(column=(self.x.col_item, ),
-                                    where={'id': self.x.id, 'rn': self.current, 'root': 0},
-                                    order=(self.x.col_item, ))[0][0]
-        raise StopIteration
+    def __len__(self):
+        return len(self.x)
 
 
 class dict_values:
@@ -131,18 +141,17 @@ class dict_values:
 
     def __init__(self, x):
         self.x = x
-        self.current = -1
-        self.high = len(self.x)
 
     def __iter__(self):
-        self.current = -1
-        return self
+        for row, value in self.x._iter_items_():
+            yield value
+
+    def __contains__(self, x):
+        """Indexed lookup of the content hash of x (see Nested._matches_)"""
+        return len(self.x._matches_(x, first=True)) > 0
 
-    def __next__(self):
-        self.current += 1
-        if self.current < self.high:
-            return self.x.db[{'id': self.x.id, 'rn': self.current, 'root': 0}][2][0]
-        raise StopIteration
+    def __len__(self):
+        return len(self.x)
 
 
 class dict_items:
@@ -150,16 +159,10 @@ class dict_items:
 
     def __init__(self, x):
         self.x = x
-        self.current = -1
-        self.high = len(self.x)
 
     def __iter__(self):
-        self.current = -1
-        return self
-
-    def __next__(self):
-        self.current += 1
-        if self.current < self.high:
-            item = self.x.db[{'id': self.x.id, 'rn': self.current, 'root': 0}]
-            return item[0][0], item[2][0]
-        raise StopIteration
+        for row, value in self.x._iter_items_():
+            yield row[3], value
+
+    def __len__(self):
+        return len(self.x)
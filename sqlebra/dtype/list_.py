@@ -1,6 +1,7 @@
 from ..object.nested import Nested
 import builtins
 from .. import py2sql
+from .. import utils
 from sqlebra import exceptions as ex
 
 
@@ -9,68 +10,158 @@ class list_(Nested):
 
     pyclass = builtins.list
     col_item = 'ind'
+    # Storage layouts:
+    #   None: items are numbered 0, 1, 2, ... Inserting or removing an item renumbers every item to its right.
+    #   'sparse': items are numbered in steps of list_.gap, and new items take an 'ind' between their neighbours.
+    #       Inserting or removing an item leaves the other items untouched (see list_.renumber).
+    layouts = (None, 'sparse')
+    # Step between the 'ind' of consecutive items of 'sparse' lists
+    gap = 2 ** 16
+    # Classes of single values which can be compared with each other, and sorted by the database (see list_.sort)
+    sort_groups = ({'bool', 'int', 'float'}, {'str'}, {'bytes'})
 
     @property
     def py(self):
-        x = []
-        try:
-            rows = self.db[{'id': self.id, '*': 'root = 0'}][2]
-        except ex.VariableError:  # Empty list
-            # Possibly an empty list. Retrieve root to assert
-            self.db[{'id': self.id, '*': 'root = 1'}]
-        else:
-            for row in rows:
-                x.append(row.py)
-        return x
+        return Nested.py.fget(self)
 
     @py.setter
+    @utils.operation
     def py(self, x):
         if not isinstance(x, self.pyclass):
             raise TypeError('{} expects a value of type {}. Found type {} instead'.format(
                 type(self), self.pyclass, type(x)))
+        self.db._nested_write_(self.id)
         # Empty current
-        self.clear()
+        self._clear_()
         # Insert new values
-        value_item = {'id': self.id, 'root': False, 'user_defined': False}
+        self._insert_items_(x)
+
+    @classmethod
+    def value2row(cls, x, layout=None):
+        if layout not in cls.layouts:
+            raise ValueError("Layout '{}' not supported by {}".format(layout, cls))
+        row = super(list_, cls).value2row(x)
+        if layout is not None:
+            row['txt_val'] = layout
+        return row
+
+    @classmethod
+    def content_hash(cls, hashes):
+        """Items are hashed in order, regardless of their 'ind' (see Nested.content_hash)"""
+        hashes = [h for item, h in hashes]
+        if utils.NO_HASH in hashes:
+            return utils.NO_HASH
+        return utils.content_hash(cls.pyclass.__name__, repr(hashes))
+
+    @classmethod
+    def rows2value(cls, root, rows, row2value):
+        return cls.pyclass(row2value(row) for row in rows)
+
+    @classmethod
+    def value2items(cls, name, x, layout=None, **options):
+        step = cls.gap if layout == 'sparse' else 1
         for ind, value in enumerate(x):
-            value_item['name'] = self._nameitem_(ind)
-            value_item[self.col_item] = ind
-            self.db[value_item.copy()] = value
+            yield {'name': cls._name_(name, ind), cls.col_item: ind * step}, value
+
+    def _inds_(self, positions):
+        """
+        Return the 'ind' of the items at the given positions. Items of 'sparse' lists are located with an offset
+        query over the ('id', 'root', 'ind') index.
+
+        :param positions: (list of int) Non-negative positions (see list_._check_item_)
+        """
+        if self.layout != 'sparse':
+            return positions
+        return [self.db.select(column=('ind', ), where={'id': self.id, 'root': False, 'rn': i}, order=('ind', ))[0][0]
+                for i in positions]
+
+    def _pos_(self, ind):
+        """Return the position of the item with the given 'ind'"""
+        if self.layout != 'sparse':
+            return ind
+        return self.db.select(column=('count(*)', ), where={'id': self.id, 'root': False, '*': ('ind < ?', ind)})[0][0]
+
+    @utils.operation
+    def renumber(self):
+        """
+        Renumber the items of the list to consecutive multiples of list_.gap ('sparse' lists) or to consecutive
+        integers, with a single query. Restores the room between the items of 'sparse' lists, and is called by
+        list_.insert when two neighbouring items leave none.
+        """
+        self._reorder_('ind')
+
+    def _reorder_(self, order):
+        """
+        Renumber the items of the list in the given order with a single query (see list_.renumber)
+
+        :param order: (str) SQL expression ordering the items, over the columns of their rows.
+        """
+        db = self.db
+        query = db._query(('reorder', order), lambda: db.dialect.update_from(
+            db.name, 'ind = r.new_ind',
+            'select ind as old_ind, (row_number() over (order by {o}) - 1) * {p} as new_ind from {t} '
+            'where id = {p} and root = 0'.format(o=order, t=db.name, p=db.dialect.placeholder),
+            'r', '{t}.id = {p} and {t}.root = 0 and {t}.ind = r.old_ind'.format(t=db.name, p=db.dialect.placeholder)))
+        db.execute(query, (self.gap if self.layout == 'sparse' else 1, self.id, self.id))
+        db._invalidate_([self.id])
+        db._group_write_()
+
+    def _sort_order_(self, reverse=False, alias=''):
+        """
+        SQL expression ordering the items of the list by value, with ties kept in list order (see list_.sort)
+
+        :param reverse: (bool) Descending order
+        :param alias: (str) Prefix of the columns of the item rows (e.g. 'i.')
+        :return: (str) or None if any item holds a nested value.
+        """
+        classes = {c for c, in self.db.select(column=('distinct class', ), where={'id': self.id, 'root': False})}
+        if any(c not in py2sql.py2sql_single_str for c in classes):
+            return None
+        if (len(classes) > 1 and not any(classes <= group for group in self.sort_groups)) or \
+                (classes == {'NoneType'} and len(self) > 1):
+            raise TypeError("Items of types {} cannot be compared".format(', '.join(sorted(classes))))
+        # Each item holds its value in a single column
+        value = 'coalesce({a}bool_val, {a}int_val, {a}real_val, {a}txt_val, {a}blob_val)'.format(a=alias)
+        return '{}{}, {}ind'.format(value, ' desc' if reverse else '', alias)
 
     def __getitem__(self, item):
-        x = super(list_, self).__getitem__(self._check_item_(item))[2]
+        if isinstance(item, slice):
+            return self.slice(item.start, item.stop, item.step)
+        x = super(list_, self).__getitem__(self._inds_(self._check_item_(item)))[2]
         if isinstance(item, int):
             return x[0]
         else:
             return x
 
+    @utils.operation
     def __setitem__(self, key, value):
+        self.db._nested_write_(self.id)
         item = self._check_item_(key)
+        ind = self._inds_(item)[0]
         # Retrieve selected row
-        row = self.db[{'id': self.id, self.col_item: item}][2]
+        row = self.db[{'id': self.id, self.col_item: ind}][2]
         if len(row) != 1:
             if len(row) == 0:
                 raise ex.CorruptedDatabase('Item {} not found in the SQL database'.format(key))
             else:
                 raise ex.ValueError('Multiple rows selected for setting')
-        # Retrieve row
-        row = self.db[{'id': self.id, self.col_item: item[0]}][2][0]
+        row = row[0]
         try:  # Update row
             row.py = value
-        except TypeError:  # Delete row and add new variable
+        except (TypeError, ex.SharedValueError):  # Delete row and add new variable
+            self.db.delete(where={'id': self.id, self.col_item: ind})
             row.delete()
-            self.db.delete(where={'id': self.id, self.col_item: key})
             self.db[{'id': self.id,
                      'root': False,
                      'user_defined': False,
                      'name': self._nameitem_(item[0]),
-                     self.col_item: item[0]
+                     self.col_item: ind
                      }] = value
 
     def _check_item_(self, item):
         if isinstance(item, int):
             item = [item]
-        elif isinstance(item, list_):
+        elif isinstance(item, list):
             pass
         else:
             raise TypeError("Index must be of type 'int' or 'list'. Found '{}' instead".format(type(item)))
@@ -82,20 +173,90 @@ class list_(Nested):
                 raise ValueError("Index out of range")
         return item
 
+    def slice(self, start=None, stop=None, step=None, lazy=False):
+        """
+        Items selected by a slice, as in a[start:stop:step], read with a single query over a range of positions.
+
+        :param lazy: (bool) If True, return a view which streams the items when iterated (see list_slice_view).
+        :return: (list) of SQLebra objects, or a list_slice_view.
+        """
+        view = list_slice_view(self, slice(start, stop, step))
+        # Built from an iterator, since list() would otherwise count the items of the list through len(view)
+        return view if lazy else list(iter(view))
+
+    def _iter_slice_(self, s):
+        """
+        Stream the items selected by a slice: positions between its bounds, filtered by a modulo of its step. The
+        positions of 'sparse' lists are numbered by a window function.
+
+        :param s: (slice)
+        :return: (generator) of (row, object) tuples (see Nested._stream_items_)
+        """
+        start, stop, step = s.start, s.stop, 1 if s.step is None else s.step
+        if step == 0:
+            raise ValueError('slice step cannot be zero')
+        if step < 0 or (start is not None and start < 0) or (stop is not None and stop < 0):
+            # Bounds relative to the end of the list
+            start, stop, step = s.indices(len(self))
+        elif start is None:
+            start = 0
+        # Range of selected positions. An open range runs to the end of the list.
+        if step > 0:
+            low, high = start, None if stop is None else stop - 1
+        else:
+            low, high = stop + 1, start
+        if high is not None and low > high:
+            return iter(())
+        db = self.db
+        sparse = self.layout == 'sparse'
+        pars = [self.id, low] + ([] if high is None else [high]) + ([] if abs(step) == 1 else [start, abs(step)])
+
+        def build():
+            d = db.dialect
+            p = d.placeholder
+            if sparse:
+                pos = 'i.pos'
+                source = '(select *, row_number() over (order by ind) - 1 as pos from {t} ' \
+                         'where id = {p} and root = 0) i'.format(t=db.name, p=p)
+                where = ''
+                columns = ', '.join('i.{}'.format(d.quote(c)) for c in db._table_columns)
+            else:  # Positions are the 'ind' of the items
+                pos = 'i.ind'
+                source = '{} i'.format(db.name)
+                where = 'i.id = {} and i.root = 0 and '.format(p)
+                columns = 'i.*'
+            where += '{} >= {}'.format(pos, p) if high is None else '{} between {p} and {p}'.format(pos, p=p)
+            if abs(step) != 1:
+                where += ' and {} = 0'.format(d.mod('{} - {}'.format(pos, p), p))
+            return 'select {}, c.* from {} left join {t} c on c.id = i.child_id and c.root = 1 ' \
+                   'where {} order by {}{}'.format(columns, source, where, pos, ' desc' if step < 0 else '', t=db.name)
+
+        query = db._query(('slice', sparse, high is None, abs(step) != 1, step < 0), build)
+        return self._stream_items_(query, pars)
+
+    @utils.operation
     def append(self, x):
         """Add an item to the end of the list. Equivalent to a[len(a):] = [x]."""
-        ind = len(self)
+        self.db._nested_write_(self.id)
+        i = len(self)
+        if self.layout == 'sparse':
+            last = self.db.select(column=('max(ind)', ), where={'id': self.id, 'root': False})[0][0]
+            ind = 0 if last is None else last + self.gap
+        else:
+            ind = i
         self.db[{'id': self.id,
-                 'name': self._nameitem_(ind),
+                 'name': self._nameitem_(i),
                  self.col_item: ind,
                  'root': False,
                  'user_defined': False}] = x
 
+    @utils.operation
     def extend(self, iterable):
         """Extend the list by appending all the items from the iterable. Equivalent to a[len(a):] = iterable."""
         for x in iterable:
             self.append(x)
 
+    @utils.operation
     def insert(self, i, x):
         """
         Insert an item at a given position. The first argument is the index of the element before which to insert,
@@ -105,17 +266,36 @@ class list_(Nested):
         :param x:
         :return:
         """
-        if i < len(self):  # Need to update the index of all elements to the right of i
+        len_x = len(self)
+        if i < 0:
+            i = max(len_x + i, 0)
+        if i >= len_x:
+            return self.append(x)
+        self.db._nested_write_(self.id)
+        if self.layout == 'sparse':  # Take an 'ind' between the neighbouring items
+            ind = self._gap_ind_(i)
+        else:  # Need to update the index of all elements to the right of i
             # Interface directly with the database to maximize speed
-            self.db.update(set={'*': 'ind = ind + 1'}, where={'id': self.id, '*': 'ind >= {}'.format(i)})
-            # self.db.execute('update {} set ind = ind + 1 where id = ? and ind >= ?'.format(self.db.name), (self.id, i))
+            self.db.update(set={'*': 'ind = ind + 1'}, where={'id': self.id, '*': ('ind >= ?', i)})
+            ind = i
         # Insert the new value in the selected position
         self.db[{'id': self.id,
-                 'name': self.name,
-                 self.col_item: i,
+                 'name': self._nameitem_(i),
+                 self.col_item: ind,
                  'root': False,
                  'user_defined': False}] = x
 
+    def _gap_ind_(self, i):
+        """'ind' of a new item inserted before position i of a 'sparse' list (see list_.insert)"""
+        after = self._inds_([i])[0]
+        if i == 0:
+            return after - self.gap
+        before = self._inds_([i - 1])[0]
+        if after - before < 2:  # No room left between the neighbours
+            self.renumber()
+            return i * self.gap - self.gap // 2
+        return (before + after) // 2
+
     def index(self, x, start=None, end=None):
         """
         Return zero-based index in the list of the first item whose value is equal to x. Raises a ValueError if
@@ -130,34 +310,24 @@ class list_(Nested):
         :param end:
         :return:
         """
-        if type(x) in py2sql.py2sql_single:
-            py2sql.py2sql_single[type(x)].value2row(x)
-            x_row = {'id': self.id, 'rn': 0, **py2sql.py2sql_single[type(x)].value2row(x)}
-            # Search for matching class
-            ind = self.db.select(column=('ind',), where=x_row, order=('ind', ))
-            if len(ind) == 0:
-                raise ValueError('Value {} not found in list'.format(x))
-            else:
-                return ind[0][0]
+        return self._pos_(self._index_(x))
 
-        else:
-            raise NotImplemented
-            # Search for matching class
-            pos_ind = self.db.select(column=('ind', ),
-                                     where={'id': self.id, 'class': x.__class__.__name__, '*': 'ind is not NULL'})
-            # Search for matching values
-            if len(pos_ind) == 0:
-                raise ValueError('Value {} not found in list'.format(x))
-            # Check value of possible matching indices
-            pos_ind = [x[0] for x in pos_ind]
-            for row in self.db.v[{'id': self.id, 'ind': pos_ind}]:
-                if row.multivalue and row.x.x == x:
-                    return row.ind
-                elif row.x == x:
-                    return row.ind
-            # If this point is reached, no matching value was found
+    def _index_(self, x):
+        """Return the 'ind' of the first item equal to x, looked up by its content hash (see list_.index)"""
+        # Matches are few, and ordered here: ordering them in SQL would favour the index on 'ind' over the hash index
+        inds = self._matches_(x)
+        if len(inds) == 0:
             raise ValueError('Value {} not found in list'.format(x))
+        return min(inds)
 
+    def __contains__(self, x):
+        try:
+            self._index_(x)
+        except ValueError:
+            return False
+        return True
+
+    @utils.operation
     def remove(self, x):
         """
         Remove the first item from the list whose value is equal to x. It raises a ValueError if there is no
@@ -166,13 +336,17 @@ class list_(Nested):
         :return:
         """
         # Find index of object
-        ind = self.index(x)
+        ind = self._index_(x)
+        self.db._nested_write_(self.id)
         # Remove object
-        self.db[{'id': self.id, 'ind': ind}][2][0].delete()
+        row = self.db[{'id': self.id, 'ind': ind}][2][0]
+        self.db.delete(where={'id': self.id, 'ind': ind})
+        row.delete()
         # Update indices if necessary
-        if ind < len(self)-1:
-            self.db.update(set={'*': 'ind = ind - 1'}, where={'id': self.id, '*': 'ind>{}'.format(ind)})
+        if self.layout != 'sparse':
+            self.db.update(set={'*': 'ind = ind - 1'}, where={'id': self.id, '*': ('ind > ?', ind)})
 
+    @utils.operation
     def pop(self, i=-1):
         """
         Remove the item at the given position in the list, and return it. If no index is specified, a.pop() removes
@@ -186,15 +360,17 @@ class list_(Nested):
         if not isinstance(i, int):
             raise TypeError('i must be {}. Found {} instead'.format(int, type(i)))
         i = self._check_item_(i)[0]
+        self.db._nested_write_(self.id)
+        ind = self._inds_([i])[0]
         # Retrieve value
-        x = self[i]
+        x = self.db[{'id': self.id, 'ind': ind}][2][0]
         x_py = x.py
         # Delete variable and value from list
+        self.db.delete(where={'id': self.id, 'ind': ind})
         x.delete()
-        self.db.delete(where={'id': self.id, 'ind': i})
         # Update indices if necessary
-        if i < len(self):
-            self.db.update(set={'*': 'ind = ind - 1'}, where={'id': self.id, '*': 'ind>{}'.format(i)})
+        if self.layout != 'sparse' and i < len(self):
+            self.db.update(set={'*': 'ind = ind - 1'}, where={'id': self.id, '*': ('ind > ?', i)})
         return x_py
 
     def count(self, x):
@@ -204,40 +380,38 @@ class list_(Nested):
         :param x:
         :return:
         """
-        if type(x) in py2sql.py2sql_single:
-            py2sql.py2sql_single[type(x)].value2row(x)
-            x_row = {'id': self.id, **py2sql.py2sql_single[type(x)].value2row(x)}
-            # Search for matching class
-            return self.db.select(column=('count(*)',), where=x_row, order=('ind', ))[0][0]
-        else:
-            raise NotImplemented
-
-            # Search for matching class
-            pos_ind = self.db.execute('select ind from [values] where id = ? and class_name = ?',
-                                      (self.id, x.__class__.__name__))
-            # Search for matching values
-            if len(pos_ind) == 0:
-                raise ValueError('Value {} not found in list'.format(x))
-            # Check value of possible matching indices
-            pos_ind = [x[0] for x in pos_ind]
-            count = 0
-            for row in self.db.v[{'id': self.id, 'ind': pos_ind}]:
-                if row.multivalue and row.py.py == x:
-                    count += 1
-                elif row.py == x:
-                    count += 1
-            return count
+        return len(self._matches_(x))
 
+    @utils.operation
     def sort(self, key=None, reverse=False):
         """
         Sort the items of the list in place (the arguments can be used for sort customization, see sorted() for their
-        explanation).
+        explanation). The sort is stable.
+
+        Lists of single values are sorted by the database, renumbering their items with a single query. Lists with
+        nested values, or sorted with a key function, are sorted in python and written back.
 
         :param key:
         :param reverse:
         :return:
         """
-        raise NotImplemented
+        order = None if key is not None else self._sort_order_(reverse)
+        if order is None:
+            x = self.py
+            x.sort(key=key, reverse=reverse)
+            self.py = x
+        else:
+            self.db._nested_write_(self.id)
+            self._reorder_(order)
+
+    def sorted_view(self, reverse=False):
+        """
+        Read-only view of the items of the list in sorted order, streamed from the database without rewriting the
+        list (see list_sorted_view).
+
+        :param reverse: (bool) Descending order
+        """
+        return list_sorted_view(self, reverse)
 
     def copy(self):
         """
@@ -248,21 +422,44 @@ class list_(Nested):
         return list_(self.db, id=self.id)
 
     def __iter__(self):
-        return list_iterator(self)
+        """Iterate over the items of the list, streamed from a single query (see Nested._iter_items_)"""
+        for row, item in self._iter_items_():
+            yield item
 
 
-class list_iterator:
+class list_sorted_view:
+    """View of list items, sorted by value (see list_.sorted_view)"""
 
-    def __init__(self, x):
+    def __init__(self, x, reverse=False):
         self.x = x
-        self.current = -1
-        # Static parameter. A dynamic parameter would be more flexible but slower. Anyway, one shouldn't
-        # change the length of an iterator on the go.
-        self.high = len(self.x)
-
-    def __next__(self):
-        self.current += 1
-        if self.current < self.high:
-            return self.x[self.current]
-        self.current = None
-        return StopIteration
+        self.reverse = reverse
+
+    def __iter__(self):
+        order = self.x._sort_order_(self.reverse, 'i.')
+        if order is None:
+            raise TypeError('Only lists of single values can be viewed in sorted order')
+        for row, item in self.x._iter_items_(order):
+            yield item
+
+    def __len__(self):
+        return len(self.x)
+
+
+class list_slice_view:
+    """View of the list items selected by a slice (see list_.slice)"""
+
+    def __init__(self, x, s):
+        self.x = x
+        self.slice = s
+
+    def __iter__(self):
+        for row, item in self.x._iter_slice_(self.slice):
+            yield item
+
+    def __len__(self):
+        return len(range(*self.slice.indices(len(self.x))))
+
+    @property
+    def py(self):
+        """Python value of the selected items"""
+        return self.x.pyclass(item.py for item in self)
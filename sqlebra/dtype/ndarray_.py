@@ -1,7 +1,9 @@
 from ..object.nested import Nested
 import numpy as np
 import copy
+import zlib
 from sqlebra import exceptions as ex
+from sqlebra import utils
 
 
 class ndarray_(Nested):
@@ -9,9 +11,25 @@ class ndarray_(Nested):
 
     pyclass = np.ndarray
     col_item = 'ind'
+    # Storage layouts:
+    # + None: Each element in its own row, indexed by its ravelled index.
+    # + 'blob': Raw data buffer in a single row with key 'data'.
+    # + 'chunk': Array split into tiles of shape 'chunks', each stored as a raw data buffer (optionally compressed)
+    #   in its own row, indexed by the ravelled index of the tile in the grid of tiles.
+    layouts = (None, 'blob', 'chunk')
+    compressions = (None, 'zlib')
+    chunk_bytes = 2 ** 20  # Approximate size of the default tiles
 
     @property
     def py(self):
+        if self.layout is not None:
+            if self._slice is None:
+                return self._read_()
+            x = self._read_(self._slice['ind'])
+            if len(self._slice['shape']) == 0:  # Single element
+                return x.item(0)
+            else:
+                return np.reshape(x, self._slice['shape'])
         x = []
         if self._slice is None:
             try:
@@ -30,51 +48,119 @@ class ndarray_(Nested):
                 return np.reshape(np.array([r.py for r in rows], dtype=self.dtype), self.shape)
 
     @py.setter
+    @utils.operation
     def py(self, x):
         if len(x.dtype) > 0:
             raise NotImplemented('numpy structured arrays are not currently supported by SQLebra')
         if not isinstance(x, self.pyclass):
             x = np.array(x)
+        # Keep the layout of the variable, unless it does not support the new value
+        layout = self._layout_(x, self.layout)
+        if layout != self.layout:
+            self.db.update(set={'txt_val': layout}, where={'id': self.id, 'root': True})
+            self.row = self.row[:8] + (layout, ) + self.row[9:]
         # Empty current
         self.clear()
         # Insert new values
-        value_item = {'id': self.id, 'root': False, 'user_defined': False}
+        self._insert_items_(x)
+
+    @classmethod
+    def _layout_(cls, x, layout):
+        """Layout used to store array x when <layout> is requested"""
+        if layout not in cls.layouts:
+            raise ValueError("Layout '{}' not supported by {}".format(layout, cls))
+        if layout in ('blob', 'chunk') and x.dtype.hasobject:  # Python objects have no raw data buffer
+            return None
+        return layout
+
+    @classmethod
+    def value2row(cls, x, layout=None):
+        row = super(ndarray_, cls).value2row(x)
+        layout = cls._layout_(x, layout)
+        if layout is not None:
+            row['txt_val'] = layout
+        return row
+
+    @classmethod
+    def value2items(cls, name, x, layout=None, chunks=None, compression=None, **options):
+        layout = cls._layout_(x, layout)
         # Save properties:
         # + dtype
-        property_item = value_item.copy()
-        property_item['key'] = 'dtype'
-        property_item['name'] = self._nameitem_('dtype')
-        value = x.dtype.descr
-        self.db[property_item] = value
+        yield {'name': cls._name_(name, 'dtype'), 'key': 'dtype'}, x.dtype.descr
         # + shape
         shape = x.shape
-        property_item['key'] = 'shape'
-        property_item['name'] = self._nameitem_('shape')
-        value = shape
-        self.db[property_item] = value
+        yield {'name': cls._name_(name, 'shape'), 'key': 'shape'}, shape
         # Save data
+        if layout == 'blob':
+            yield {'name': cls._name_(name, 'data'), 'key': 'data'}, x.tobytes()
+            return
+        if layout == 'chunk':
+            if compression not in cls.compressions:
+                raise ValueError("Compression '{}' not supported by {}".format(compression, cls))
+            chunks = cls._chunks_(shape, x.dtype.itemsize, chunks)
+            yield {'name': cls._name_(name, 'chunks'), 'key': 'chunks'}, chunks
+            yield {'name': cls._name_(name, 'compression'), 'key': 'compression'}, compression
+            for ind, coord in enumerate(np.ndindex(*_grid_(shape, chunks))):
+                tile = tuple(slice(c * n, (c + 1) * n) for c, n in zip(coord, chunks))
+                yield ({'name': '{}[{}]'.format(name, ', '.join('{}:{}'.format(s.start, s.stop) for s in tile)),
+                        cls.col_item: ind},
+                       _encode_(x[tile], compression))
+            return
         for ind, value in enumerate(x.flatten()):
-            if not isinstance(value, np.ndarray):
+            if isinstance(value, np.generic):
                 value = value.item()
-            value_item['name'] = self._nameitem_(ind, shape)
-            value_item[self.col_item] = ind
-            self.db[value_item.copy()] = value
+            yield {'name': cls._name_(name, ind, shape), cls.col_item: ind}, value
 
     @property
     def shape(self):
         if self._slice is None:
-            return self.db[{'id': self.id, 'key': 'shape'}][2][0].py
+            return self._shape_()
         else:
             return self._slice['shape']
 
+    def _shape_(self):
+        """Shape of the whole array, ignoring the slice mask"""
+        return self.db[{'id': self.id, 'key': 'shape'}][2][0].py
+
+    @classmethod
+    def _chunks_(cls, shape, itemsize, chunks=None):
+        """
+        Shape of the tiles of a 'chunk' array
+
+        :param shape: (tuple) Shape of the array
+        :param itemsize: (int) Size in bytes of each element
+        :param chunks: (int or tuple) Requested tile shape. If None, or a tuple with a different number of dimensions
+            than the array, tiles of about ndarray_.chunk_bytes are used.
+        :return: (tuple) Tile shape
+        """
+        if chunks is not None and not isinstance(chunks, int) and len(chunks) != len(shape):
+            chunks = None
+        if chunks is None:
+            chunks = max(1, int((cls.chunk_bytes / itemsize) ** (1 / max(1, len(shape)))))
+        if isinstance(chunks, int):
+            chunks = (chunks, ) * len(shape)
+        return tuple(max(1, min(c, s)) for c, s in zip(chunks, shape))
+
     @property
     def dtype(self):
-        dtype = self.db[{'id': self.id, 'key': 'dtype'}][2][0].py
-        dtype = [(dtype_n[0], np.dtype(dtype_n[1])) for dtype_n in dtype]
-        if len(dtype) == 1:
-            return dtype[0][1]
-        else:
-            return dtype
+        return _dtype_(self.db[{'id': self.id, 'key': 'dtype'}][2][0].py)
+
+    @classmethod
+    def rows2value(cls, root, rows, row2value):
+        properties = {row[3]: row2value(row) for row in rows if row[3] is not None}
+        dtype = _dtype_(properties['dtype'])
+        shape = tuple(properties['shape'])
+        if root[8] == 'blob':
+            return _decode_(properties['data'], dtype, shape, None)
+        elements = [row for row in rows if row[4] is not None]
+        if root[8] == 'chunk':
+            chunks = tuple(properties['chunks'])
+            x = np.empty(shape, dtype=dtype)
+            for row in elements:
+                tile = _tile_(row[4], shape, chunks)
+                x[tile] = _decode_(row2value(row), dtype, _tile_shape_(tile), properties['compression'])
+            return x
+        return np.reshape(np.array([row2value(row) for row in elements], dtype=dtype), shape)
 
     def __init__(self, *args, **kwargs):
         super(Nested, self).__init__(*args, **kwargs)
@@ -89,13 +175,14 @@ class ndarray_(Nested):
         item, res_shape = self._check_item_(item)
         if self._slice is not None:
             item = [self._slice['ind'][i] for i in item]
-        if len(res_shape) == 0:
+        if len(res_shape) == 0 and self.layout is None:
             return super(ndarray_, self).__getitem__(item)[2][0]
-        else:  # Return a slice of the array
+        else:  # Return a slice of the array. Single elements of a 'blob' array are returned as 0-d slices.
             x = copy.copy(self)
             x._slice = {'ind': item, 'shape': res_shape}
             return x
 
+    @utils.operation
     def __setitem__(self, key, value):
         # Retrieve selected item
         item, item_shape = self._check_item_(key)
@@ -113,6 +200,11 @@ class ndarray_(Nested):
                         ))
             else:
                 value = [value]*len(item)
+        if self._slice is not None:
+            item = [self._slice['ind'][i] for i in item]
+        if self.layout is not None:
+            self._write_(item, value)
+            return
         # Prepare row
         rows = self.db[{'id': self.id, self.col_item: item}][2]
         if len(rows) == 0:
@@ -201,6 +293,80 @@ class ndarray_(Nested):
                 item[d] = np.broadcast_to(np.reshape(item[d], item_d_shape), item_shape).flatten()
         return np.ravel_multi_index(item, shape).tolist(), tuple(res_shape)
 
+    def _read_(self, ind=None):
+        """
+        Read data from a 'blob' or 'chunk' array.
+
+        :param ind: (list of int) Ravelled indices of the elements to read. If None, read the whole array.
+        :return: (np.ndarray) The whole array, or a flat array with the selected elements
+        """
+        dtype = self.dtype
+        shape = self._shape_()
+        if self.layout == 'blob':
+            data = self.db.select(column=('blob_val', ), where={'id': self.id, 'key': 'data'})[0][0]
+            x = _decode_(data, dtype, shape, None)
+            return x if ind is None else x.ravel()[ind]
+        # 'chunk' layout. Only the tiles containing the selected elements are read.
+        chunks, compression = self._chunk_info_()
+        if ind is None:
+            x = np.empty(shape, dtype=dtype)
+            rows = self.db.select(column=('ind', 'blob_val'), where={'id': self.id, 'root': 0, '*': 'ind is not NULL'})
+            for tile_ind, data in rows:
+                tile = _tile_(tile_ind, shape, chunks)
+                x[tile] = _decode_(data, dtype, _tile_shape_(tile), compression)
+            return x
+        x = np.empty(len(ind), dtype=dtype)
+        for tile, mask, local, tile_x in self._read_tiles_(ind, shape, chunks, compression, dtype):
+            x[mask] = tile_x[local]
+        return x
+
+    def _write_(self, ind, value):
+        """
+        Write data to a 'blob' or 'chunk' array.
+
+        :param ind: (list of int) Ravelled indices of the elements to write
+        :param value: (list) Values of the elements to write
+        """
+        dtype = self.dtype
+        shape = self._shape_()
+        value = np.asarray(value, dtype=dtype)
+        if self.layout == 'blob':
+            x = self._read_()
+            x.reshape(-1)[ind] = value
+            self.db.update(set={'blob_val': x.tobytes()}, where={'id': self.id, 'key': 'data'})
+            return
+        # 'chunk' layout. Only the tiles containing the selected elements are read and written.
+        chunks, compression = self._chunk_info_()
+        for tile_ind, mask, local, tile_x in self._read_tiles_(ind, shape, chunks, compression, dtype):
+            tile_x[local] = value[mask]
+            self.db.update(set={'blob_val': _encode_(tile_x, compression)},
+                           where={'id': self.id, self.col_item: tile_ind})
+
+    def _chunk_info_(self):
+        """Tile shape and compression of a 'chunk' array"""
+        return (tuple(self.db[{'id': self.id, 'key': 'chunks'}][2][0].py),
+                self.db[{'id': self.id, 'key': 'compression'}][2][0].py)
+
+    def _read_tiles_(self, ind, shape, chunks, compression, dtype):
+        """
+        Read the tiles of a 'chunk' array containing the selected elements, with a single query
+
+        :param ind: (list of int) Ravelled indices of the selected elements
+        :return: (generator) of tuples (tile index, mask of the selected elements in the tile, indices of those
+            elements within the tile, decoded tile)
+        """
+        coords = np.unravel_index(ind, shape)
+        grid = _grid_(shape, chunks)
+        tile_coords = tuple(c // n for c, n in zip(coords, chunks))
+        tile_ind = np.ravel_multi_index(tile_coords, grid)
+        rows = self.db.select(column=('ind', 'blob_val'), where={'id': self.id, 'root': 0,
+                                                                  self.col_item: np.unique(tile_ind).tolist()})
+        for tile_n, data in rows:
+            tile = _tile_(tile_n, shape, chunks)
+            mask = tile_ind == tile_n
+            local = tuple(c[mask] - t.start for c, t in zip(coords, tile))
+            yield tile_n, mask, local, _decode_(data, dtype, _tile_shape_(tile), compression)
+
     def __len__(self):
         if self._slice is None:
             child_id = self.db.select(column=['child_id'], where={'id': self.id, 'key': 'shape'})[0][0]
@@ -209,15 +375,60 @@ class ndarray_(Nested):
             return self._slice['shape'][0]
 
     def _nameitem_(self, item, shape=None):
+        """Overloaded method that allows unravelling indices"""
+        return self._name_(self.name, item, shape)
+
+    @staticmethod
+    def _name_(name, item, shape=None):
         """Overloaded method that allows unravelling indices"""
         if shape is None:
-            return super(ndarray_, self)._nameitem_(item)
+            return Nested._name_(name, item)
         if isinstance(item, int):
-            return "{}{}".format(self.name, list(np.unravel_index(item, shape)))
+            return "{}{}".format(name, list(np.unravel_index(item, shape)))
         else:
             raise TypeError
 
 
+def _dtype_(descr):
+    """numpy dtype from its stored description (see np.dtype.descr)"""
+    dtype = [(dtype_n[0], np.dtype(dtype_n[1])) for dtype_n in descr]
+    if len(dtype) == 1:
+        return dtype[0][1]
+    else:
+        return dtype
+
+
+def _grid_(shape, chunks):
+    """Shape of the grid of tiles of a 'chunk' array"""
+    return tuple(-(-s // c) for s, c in zip(shape, chunks))
+
+
+def _tile_(tile_ind, shape, chunks):
+    """Slices selecting tile number <tile_ind> of a 'chunk' array"""
+    coord = np.unravel_index(tile_ind, _grid_(shape, chunks))
+    return tuple(slice(int(c) * n, min((int(c) + 1) * n, s)) for c, n, s in zip(coord, chunks, shape))
+
+
+def _tile_shape_(tile):
+    """Shape of the tile selected by slices <tile>"""
+    return tuple(t.stop - t.start for t in tile)
+
+
+def _encode_(x, compression):
+    """Raw data buffer of array x"""
+    data = np.ascontiguousarray(x).tobytes()
+    if compression == 'zlib':
+        data = zlib.compress(data)
+    return data
+
+
+def _decode_(data, dtype, shape, compression):
+    """Array with the given dtype and shape from a raw data buffer"""
+    if compression == 'zlib':
+        data = zlib.decompress(data)
+    return np.frombuffer(data, dtype=dtype).reshape(shape).copy()
+
+
 def _check_index_(dim, dim_size, ind):
     """
     Check integer index is valid and convert to positive integer
@@ -11,7 +11,7 @@ class tuple_(list_):
 
     @property
     def py(self):
-        return builtins.tuple(list_.py.fget(self))
+        return list_.py.fget(self)
 
     @py.setter
     def py(self, x):
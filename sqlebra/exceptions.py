@@ -8,3 +8,7 @@ class CorruptedDatabase(Exception):
 
 class ConnectionError(Exception):
     pass
+
+
+class SharedValueError(Exception):
+    pass
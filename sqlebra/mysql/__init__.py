@@ -15,3 +15,4 @@ mysql> FLUSH PRIVILEGES;
 """
 
 from .mysqldb import MySQLDB
+from .asyncdb import AsyncMySQLDB
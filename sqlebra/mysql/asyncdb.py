@@ -0,0 +1,15 @@
+from ..database.asyncdb import AsyncBaseDB
+from .mysqldb import MySQLDB
+
+
+class AsyncMySQLDB(AsyncBaseDB):
+    """
+    asyncio front-end of a MySQL database handler. The handler holds a single connection, so operations run one
+    at a time on a single worker thread.
+    """
+
+    db_class = MySQLDB
+
+    def __init__(self, *args, **kwargs):
+        kwargs['max_workers'] = 1
+        super(AsyncMySQLDB, self).__init__(*args, **kwargs)
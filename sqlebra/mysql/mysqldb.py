@@ -1,5 +1,8 @@
+import threading
 import mysql.connector
 from ..database.basedb import BaseDB
+from ..database.dialect import MySQLDialect
+from ..database.pool import ConnectionPool
 from .. import exceptions as ex
 
 
@@ -8,7 +11,23 @@ class MySQLDB(BaseDB):
     Class holding a MySQL database handler
     """
 
+    dialect = MySQLDialect()
+
+    # Connection pools shared by every handler of the same server and schema. See MySQLDB.pool
+    _pools = {}
+    _pools_lock = threading.Lock()
+
     def __init__(self, *args, **kwargs):
+        """
+        See BaseDB.__init__. Additional keyword arguments:
+
+        :param connect_args: (dict) Arguments passed to mysql.connector.connect.
+        :param pool_size: (int) If given, connections are taken from a pool of at most <pool_size> connections,
+            shared by all handlers of the same server and schema, and returned to it on disconnect.
+        :param pool_timeout: (float) Seconds to wait for a pooled connection. None waits forever.
+        """
+        self.pool_size = kwargs.pop('pool_size', None)
+        self.pool_timeout = kwargs.pop('pool_timeout', None)
         self.connect_args = kwargs.pop('connect_args', {})
         if 'host' not in self.connect_args:
             self.connect_args['host'] = 'localhost'
@@ -27,29 +46,56 @@ class MySQLDB(BaseDB):
         """Connect to database"""
         if self._conx:
             raise ex.ConnectionError('Database already connected')
+        if self.pool_size:
+            self._conx = self.pool.acquire()
+        else:
+            self._conx = self._new_connection()
+        self._c = self._conx.cursor()
+        return self
 
+    def _new_connection(self):
+        """Open a connection bound to the database schema, creating the schema if it does not exist"""
         # Connect to server (not database)
-        self._conx = mysql.connector.connect(
+        conx = mysql.connector.connect(
             auth_plugin='mysql_native_password',
             **self.connect_args
         )
-        self._c = self._conx.cursor()
+        c = conx.cursor()
 
         # Check if database exists
-        res = self.execute("show databases like '{}'".format(self.file))
-        if len(res) == 0:  # Create database
-            self._c.execute("CREATE DATABASE {}".format(self.file))
+        c.execute("show databases like %s", (self.file, ))
+        if len(c.fetchall()) == 0:  # Create database
+            c.execute("CREATE DATABASE {}".format(self.file))
 
         # Use database
-        self._c.execute("USE {}".format(self.file))
+        c.execute("USE {}".format(self.file))
+        c.close()
 
-        return self
+        return conx
+
+    @property
+    def pool(self):
+        """Connection pool of the database server and schema"""
+        with self._pools_lock:
+            if self._pool_key not in self._pools:
+                self._pools[self._pool_key] = ConnectionPool(self._new_connection, size=self.pool_size,
+                                                  check=lambda conx: conx.is_connected(),
+                                                  reset=lambda conx: conx.rollback(), timeout=self.pool_timeout)
+            return self._pools[self._pool_key]
+
+    @property
+    def _pool_key(self):
+        return repr(sorted(self.connect_args.items())), self.file
 
     def disconnect(self):
         if not self._conx:
             raise ex.ConnectionError('Database not connected')
+        self.flush()
         self._c.close()
-        self._conx.close()
+        if self.pool_size:
+            self.pool.release(self._conx)
+        else:
+            self._conx.close()
         self._conx = None
         self._c = None
         return self
@@ -65,11 +111,6 @@ class MySQLDB(BaseDB):
         :param pars: (list) Parameters required by the SQL query.
         :return: Result of the SQL query.
         """
-        # Addapt to MySql
-        if '?' in query:  # Parameter marker is %s
-            query = query.replace('?', "%s")
-        if 'key' in query:  # key is a reserved word
-            query = query.replace('key', "`key`")
         if pars:
             self._c.execute(query, pars)
         else:
@@ -79,22 +120,53 @@ class MySQLDB(BaseDB):
         else:
             return self._c.fetchall()
 
+    def executemany(self, query, pars):
+        """
+        Execute an sql query once for each set of parameters.
+
+        :param query: (str) SQL query
+        :param pars: (list of lists) Parameters required by each execution of the SQL query.
+        """
+        self._c.executemany(query, pars)
+
+    def _cursor_(self):
+        """
+        Buffered cursor, so that the connection can run other queries while a result is being streamed. The result
+        is held client side by mysql.connector.
+        """
+        return self._conx.cursor(buffered=True)
+
     def commit(self):
         self._conx.commit()
+        self._group_reset_()
         return self
 
     def rollback(self):
         self._conx.rollback()
+        self._invalidate_()
+        self._group_reset_()
         return self
 
-    def exists(self):
+    def exists(self, table=None):
         # Check if sqlebra table exists
         return self.execute(
-            "select count(*) from information_schema.tables where table_schema='{}' and table_name='{}'".format(
-                self.file, self.name
-            ))[0][0] == 1
+            "select count(*) from information_schema.tables where table_schema=%s and table_name=%s",
+            (self.file, table or self.name))[0][0] == 1
+
+    def indexes(self):
+        return [r[0] for r in self.execute(
+            "select distinct index_name from information_schema.statistics where table_schema=%s and table_name=%s",
+            (self.file, self.name))]
+
+    def columns(self):
+        return [r[0] for r in self.execute(
+            "select column_name from information_schema.columns where table_schema=%s and table_name=%s "
+            "order by ordinal_position", (self.file, self.name))]
 
     def rm(self):
         """Remove database from system: i.e. delete database schema from server"""
         self.execute("drop database {}".format(self.file))
         self.disconnect()
+        if self.pool_size:
+            with self._pools_lock:
+                self._pools.pop(self._pool_key).close()
@@ -1,5 +1,8 @@
 from .object import Object
 from sqlebra import exceptions as ex
+from sqlebra import utils
+from sqlebra import py2sql
+from sqlebra import variables as var
 
 
 class Nested(Object):
@@ -11,10 +14,21 @@ class Nested(Object):
     # The following variables are defined by the inheriting class.
     col_item = False  # Name of the column containing the indexing item ("key" or "ind")
     pyclass = False  # Python class
+    layouts = (None, )  # Supported storage layouts. None is the default layout.
+
+    @property
+    def layout(self):
+        """Storage layout of the variable, saved in the txt_val column of its root row"""
+        return self.txt_val
 
     def __init__(self, *args, **kwargs):
         super(Nested, self).__init__(*args, **kwargs)
 
+    @property
+    def py(self):
+        # Retrieve all nested values with a single query
+        return self.db.tree2py(self.db.tree(self.id), self.id)
+
     def __len__(self):
         return self.db.select(column=['count(*)'], where={'id': self.id, 'root': 0})[0][0]
 
@@ -25,31 +39,166 @@ class Nested(Object):
         raise NotImplemented
 
     def _nameitem_(self, item):
+        return self._name_(self.name, item)
+
+    @staticmethod
+    def _name_(name, item):
+        """Name of the nested item <item> of variable <name>"""
         if isinstance(item, str):
-            return "{}['{}']".format(self.name, item)
+            return "{}['{}']".format(name, item)
         else:
-            return '{}[{}]'.format(self.name, item)
+            return '{}[{}]'.format(name, item)
+
+    def _iter_items_(self, order=None):
+        """
+        Stream the nested items, ordered by <col_item>, with a single query which also returns the root row of
+        nested values (see BaseDB.stream).
+
+        :param order: (str) SQL expression ordering the items instead, over the columns of the item rows 'i'.
+        :return: (generator) of (row, object) tuples, where row is the item row and object its SQLebra object.
+        """
+        db = self.db
+        order = order or 'i.{}'.format(db.dialect.quote(self.col_item))
+        query = db._query(('iter_items', order), lambda: (
+            'select i.*, c.* from {t} i left join {t} c on c.id = i.child_id and c.root = 1 '
+            'where i.id = {p} and i.root = 0 order by {o}').format(t=db.name, p=db.dialect.placeholder, o=order))
+        return self._stream_items_(query, (self.id, ))
+
+    def _stream_items_(self, query, pars):
+        """
+        Stream nested items from a query returning their rows, each followed by the root row of its nested value
+        (see Nested._iter_items_).
+
+        :return: (generator) of (row, object) tuples
+        """
+        db = self.db
+        for row in db.stream(query, pars):
+            n = len(row) // 2  # Both rows hold the columns of the table, which older files may lack
+            yield row[:n], db._row2object_(row[n:] if row[9] is not None else row[:n])
+
+    def _rehash_items_(self):
+        """Compute the content hash of the items whose hash was discarded by a write (see BaseDB.rehash)"""
+        stale = self.db.select(column=('child_id', ), where={'id': self.id, 'root': False, 'hash': None})
+        if any(child_id is None for child_id, in stale):  # Items stored by older versions of SQLebra
+            self.db.rehash(self.id)
+        else:
+            for child_id, in stale:
+                self.db.rehash(child_id)
+
+    def _where_value_(self, x):
+        """
+        Return a 'where' dictionary selecting the nested items equal to python value x, looked up by their content
+        hash (see BaseDB.content_hash). Items holding single values must also match the value columns.
+        """
+        h = self.db.content_hash(x)
+        if h == utils.NO_HASH:
+            raise TypeError("Values of type '{}' cannot be searched".format(type(x)))
+        self._rehash_items_()
+        where = {'id': self.id, 'root': False, 'hash': h}
+        if type(x) in py2sql.py2sql_single:
+            where.update(py2sql.py2sql_single[type(x)].value2row(x))
+        return where
+
+    def _matches_(self, x, first=False):
+        """
+        Return the <col_item> of the items equal to python value x, in no particular order. Items are looked up by
+        their content hash (see Nested._where_value_), or compared in python in files without hashes (older files
+        opened to read).
+
+        :param first: (bool) If True, stop at the first match.
+        :return: (list)
+        """
+        if 'hash' not in self.db._table_columns:
+            col = var.COL_DICT[self.col_item]
+            matches = []
+            for row, value in self._iter_items_():
+                py = value.py
+                if type(py) == type(x) and py == x:
+                    matches.append(row[col])
+                    if first:
+                        break
+            return matches
+        where = self._where_value_(x)
+        if first:
+            where['rn'] = 0
+        return [r[0] for r in self.db.select(column=(self.col_item, ), where=where)]
+
+    def _insert_items_(self, x):
+        """Insert all items of python value x, building their rows in memory and inserting them together"""
+        rows = []
+        ids = self.db._free_ids()
+        options = self.db.layout_options.get(self.pyclass.__name__, {})
+        for item, value in self.value2items(self.name, x, self.layout, **options):
+            self.db._value2rows({'id': self.id, 'root': False, 'user_defined': False, **item}, value, rows, ids)
+        self.db.insert_many(rows)
 
+    @utils.operation
     def delete(self):
-        self.clear()
+        # A value shared by several items (see BaseDB.dedup) is only deleted once no item references it. Items are
+        # therefore deleted before their values.
+        if self.db._shared_values and self.db.select(column=('count(*)', ), where={'child_id': self.id})[0][0] > 0:
+            return
+        self._clear_()
         self.db.delete({'id': self.id})
 
+    @utils.operation
     def clear(self):
-        # Empty variables
+        """Remove all items"""
+        self.db._nested_write_(self.id)
+        self._clear_()
+
+    def _clear_(self):
+        """Delete all items, once the write has been prepared (see BaseDB._nested_write_)"""
         try:
             nested_rows = self.db[{'id': self.id, 'root': False, 'user_defined': False, '*': 'child_id is not NULL'}][2]
         except ex.VariableError:
-            pass
-        else:
-            for row in nested_rows:
-                row.delete()
+            nested_rows = []
+        # Empty variables. Items are deleted before their values (see Nested.delete)
         self.db.delete({'id': self.id, 'root': False, 'user_defined': False})
+        for row in {row.id: row for row in nested_rows}.values():
+            row.delete()
 
     @classmethod
-    def value2row(cls, x):
+    def value2row(cls, x, layout=None):
         """
         :param x: Python value to be converted
+        :param layout: Storage layout (see Nested.layouts)
         :return: (dict) With (key, value) = (column, value) corresponding to a row in the database
             containing the specified value.
         """
         return {'class': cls.pyclass.__name__}
+
+    @classmethod
+    def rows2value(cls, root, rows, row2value):
+        """
+        Build a python value from its rows
+
+        :param root: (tuple) Root row of the variable
+        :param rows: (list of tuples) Rows of the nested items, ordered by 'ind' and 'key'
+        :param row2value: (callable) Returns the python value of a nested item row
+        :return: Python value
+        """
+        raise NotImplementedError
+
+    @classmethod
+    def content_hash(cls, hashes):
+        """
+        Structural content hash of a nested value, built from the hashes of its items (see BaseDB.content_hash)
+
+        :param hashes: (iterable of tuples) (item, hash) of every nested item, ordered by <col_item>, where item is
+            the value of <col_item>.
+        :return: (int) utils.NO_HASH, unless the class supports the equality search of its values.
+        """
+        return utils.NO_HASH
+
+    @classmethod
+    def value2items(cls, name, x, layout=None, **options):
+        """
+        :param name: (str) Name of the variable containing the python value
+        :param x: Python value to be converted
+        :param layout: Storage layout (see Nested.layouts)
+        :param options: Options of the storage layout
+        :return: (generator) of (item, value) tuples for each nested item of x, where item is a dict with
+            (key, value) = (column, value) naming and indexing the nested item.
+        """
+        raise NotImplementedError
@@ -26,6 +26,8 @@ class Object:
     def root(self): return self.row[10]
     @property
     def user_defined(self): return self.row[11]
+    @property
+    def blob_val(self): return self.row[12]
 
     @property
     def py(self):
@@ -1,5 +1,6 @@
 from .object import Object
 from .. import exceptions as ex
+from .. import utils
 from .. import variables as var
 
 
@@ -14,12 +15,15 @@ class Single(Object):
         return self.__getattribute__(self.col_val)
 
     @py.setter
+    @utils.operation
     def py(self, x):
         if not isinstance(x, self.pyclass):
             raise TypeError('SQLobject {} expects a value of type {}. Given type {} instead'.format(
                 type(self), self.pyclass, type(x)))
+        if not self.root:  # Nested item
+            self.db._nested_write_(self.id)
         # Direct interfacing with the SQL database to maximize speed
-        self.db.update(set={self.col_val: x},
+        self.db.update(set={self.col_val: x, 'hash': self.content_hash(x)},
                        where={'id': self.id, 'name': self.name, 'key': self.key, 'ind': self.ind})
 
     def delete(self):
@@ -34,6 +38,14 @@ class Single(Object):
         """
         return {'class': cls.pyclass.__name__, cls.col_val: x}
 
+    @classmethod
+    def content_hash(cls, x):
+        """
+        :param x: Python value
+        :return: (int) Structural content hash of the value (see BaseDB.content_hash)
+        """
+        return utils.content_hash(cls.pyclass.__name__, repr(x))
+
     @classmethod
     def row2value(cls, row):
         """
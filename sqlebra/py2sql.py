@@ -3,6 +3,7 @@ from sqlebra.dtype import int_
 from sqlebra.dtype import float_
 from sqlebra.dtype import bool_
 from sqlebra.dtype import str_
+from sqlebra.dtype import bytes_
 from sqlebra.dtype import list_
 from sqlebra.dtype import tuple_
 from sqlebra.dtype import dict_
@@ -10,7 +11,7 @@ from sqlebra.dtype import ndarray_
 # from sqlebra.dtype.function import SQLfunction
 
 # List of SQLebra objects
-single = (int_, float_, bool_, str_, NoneType_)
+single = (int_, float_, bool_, str_, bytes_, NoneType_)
 nested = (list_, tuple_, dict_, ndarray_)
 
 # Dictionaries defining the relationship between python and sqlebra classes
@@ -1 +1,2 @@
-from .sqlitedb import SQLiteDB
\ No newline at end of file
+from .sqlitedb import SQLiteDB
+from .asyncdb import AsyncSQLiteDB
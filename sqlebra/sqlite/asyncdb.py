@@ -0,0 +1,12 @@
+from ..database.asyncdb import AsyncBaseDB
+from .sqlitedb import SQLiteDB
+
+
+class AsyncSQLiteDB(AsyncBaseDB):
+    """
+    asyncio front-end of a SQLite database handler. Each worker thread reads through its own connection (see
+    SQLiteDB threaded mode).
+    """
+
+    db_class = SQLiteDB
+    db_kwargs = {'threaded': True}
@@ -1,7 +1,13 @@
 import os
+import types
+import contextlib
 import sqlite3
+import threading
+import weakref
 import pydash
 from ..database.basedb import BaseDB
+from ..database.dialect import SQLiteDialect
+from ..database.cache import RowCache
 from .. import exceptions as ex
 
 
@@ -10,33 +16,194 @@ class SQLiteDB(BaseDB):
     Class holding a SQLite database handler
     """
 
+    dialect = SQLiteDialect()
+
+    # Named sets of pragmas applied to each connection (see SQLiteDB.__init__)
+    PROFILES = {
+        'default': {},
+        # Bulk loading: writes are not synced to disk. An application crash loses nothing, but an OS crash or power
+        # loss may corrupt the database file. Only use it for data which can be regenerated.
+        'fast-write': {'journal_mode': 'WAL', 'synchronous': 'OFF', 'cache_size': -262144, 'temp_store': 'MEMORY',
+                       'mmap_size': 0, 'busy_timeout': 5000},
+        # Concurrent readers and a single writer, with reads served from memory mapped pages
+        'read-mostly': {'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'cache_size': -65536, 'temp_store': 'MEMORY',
+                        'mmap_size': 268435456, 'busy_timeout': 5000},
+        # Every commit is synced to disk before returning
+        'durable': {'journal_mode': 'WAL', 'synchronous': 'FULL', 'cache_size': -2000, 'temp_store': 'DEFAULT',
+                    'mmap_size': 0, 'busy_timeout': 10000},
+    }
+
+    # Pragmas reported by SQLiteDB.pragmas
+    _diagnostic_pragmas = ('journal_mode', 'synchronous', 'mmap_size', 'cache_size', 'temp_store', 'busy_timeout')
+
+    # First keyword of the SQL statements which write to the database
+    _write_statements = ('insert', 'update', 'delete', 'replace', 'create', 'drop', 'alter', 'begin')
+
     def __init__(self, *args, **kwargs):
+        """
+        See BaseDB.__init__. Additional keyword arguments:
+
+        :param connect_args: (dict) Arguments passed to sqlite3.connect. The special key 'file_options' holds URI
+            options of the database file.
+        :param threaded: (bool) If True, the handler can be shared between threads. Each thread uses its own
+            connection, in WAL journal mode so that readers do not block each other, which is closed when the thread
+            ends. Writes are serialized: the
+            first write of a thread waits for any other writing thread to commit or rollback. Each connection keeps
+            its own object cache (see 'cache_size' in BaseDB.__init__), so that threads never read rows cached by
+            another thread's transaction.
+        :param profile: (str) Name of a set of pragmas applied on connect (see SQLiteDB.PROFILES): 'default',
+            'fast-write', 'read-mostly' or 'durable'.
+        :param pragmas: (dict) Pragmas applied on connect, as (key, value) = (pragma, value). Override those of
+            the profile.
+        """
         self.connect_args = kwargs.pop('connect_args', {})
+        self.threaded = kwargs.pop('threaded', False)
+        profile = kwargs.pop('profile', 'default')
+        if profile not in self.PROFILES:
+            raise ValueError("Profile '{}' is not supported. Use one of {}.".format(profile, list(self.PROFILES)))
+        self.profile = profile
+        self._pragmas = {'journal_mode': 'WAL', 'synchronous': 'NORMAL'} if self.threaded else {}
+        self._pragmas.update(self.PROFILES[profile])
+        self._pragmas.update(kwargs.pop('pragmas', {}))
+        for pragma in self._pragmas:
+            if not pragma.isidentifier():
+                raise ValueError("Invalid pragma '{}'".format(pragma))
+        # Connection state, held per thread in threaded mode
+        self._local = threading.local() if self.threaded else types.SimpleNamespace()
+        self._connected = False
+        self._connections = []  # Connections opened by all threads
+        self._connections_lock = threading.Lock()
+        self._write_lock = threading.Lock()  # Held by the thread writing to the database
         super(SQLiteDB, self).__init__(*args, **kwargs)
 
     # Python-SQL communication channel
     # ---------------------------------------------------------------
 
+    @property
+    def _conx(self):
+        """Database connection of the current thread"""
+        if getattr(self._local, 'conx', None) is None and self.threaded and self._connected:
+            self._open()
+        return getattr(self._local, 'conx', None)
+
+    @_conx.setter
+    def _conx(self, value):
+        self._local.conx = value
+
+    @property
+    def _c(self):
+        """Database connection cursor of the current thread"""
+        if getattr(self._local, 'c', None) is None and self.threaded and self._connected:
+            self._open()
+        return getattr(self._local, 'c', None)
+
+    @_c.setter
+    def _c(self, value):
+        self._local.c = value
+
+    @property
+    def _group(self):
+        """Writes pending of a group commit on the connection of the current thread"""
+        if not hasattr(self._local, 'group'):
+            self._local.group = {'writes': 0, 'start': 0.0, 'depth': 0}
+        return self._local.group
+
+    @_group.setter
+    def _group(self, value):
+        self._local.group = value
+
+    @property
+    def _cache(self):
+        """Object cache of the connection of the current thread"""
+        if not hasattr(self._local, 'cache'):
+            self._local.cache = None if self._cache_size is None else RowCache(self._cache_size)
+        return self._local.cache
+
+    @_cache.setter
+    def _cache(self, value):
+        self._cache_size = None if value is None else value.info()['maxsize']
+        self._local.cache = value
+
+    @property
+    def _transaction_level(self):
+        """Transaction level of the current thread. 0 means no transaction"""
+        return getattr(self._local, 'transaction_level', 0)
+
+    @_transaction_level.setter
+    def _transaction_level(self, value):
+        self._local.transaction_level = value
+
     def connect(self):
         """Connect to database"""
-        if self._conx:
+        if self._connected:
             raise ex.ConnectionError('Database already connected')
+        self._connected = True
+        self._open()
+        return self
+
+    def _open(self):
+        """Open a connection for the current thread"""
         if 'file_options' in self.connect_args:
             file = 'file:{}?{}'.format(self.file, self.connect_args['file_options'])
         else:
             file = self.file
+        connect_args = pydash.omit(self.connect_args, 'file_options')
+        if self.threaded:
+            connect_args.setdefault('check_same_thread', False)
         # self._conx = sqlite3.connect(file, isolation_level=None, **pydash.omit(kwargs, 'file_options'))
-        self._conx = sqlite3.connect(file, **pydash.omit(self.connect_args, 'file_options'))
-        self._c = self._conx.cursor()
-        return self
+        conx = sqlite3.connect(file, **connect_args)
+        for pragma, value in self._pragmas.items():
+            conx.execute('pragma {} = {}'.format(pragma, value))
+        with self._connections_lock:
+            self._connections.append(conx)
+        self._local.conx = conx
+        self._local.c = conx.cursor()
+        if self.threaded:
+            # The thread's local data is discarded when the thread ends, and the connection closed along with it
+            self._local.owner = _ThreadOwner()
+            weakref.finalize(self._local.owner, self._close_thread_, conx, self._connections, self._connections_lock,
+                             self._write_lock, self.group_commit is not None or self.group_interval is not None)
+
+    @staticmethod
+    def _close_thread_(conx, connections, connections_lock, write_lock, commit):
+        """
+        Close the connection of a thread which ended (see SQLiteDB._open). Writes left pending by the thread are
+        committed if they belong to a group commit, as on disconnect, and rolled back otherwise.
+        """
+        with connections_lock:
+            if conx not in connections:  # Already closed by SQLiteDB.disconnect
+                return
+            connections.remove(conx)
+        try:
+            if conx.in_transaction:  # The thread holds the write lock until its transaction finishes
+                try:
+                    if commit:
+                        conx.commit()
+                    else:
+                        conx.rollback()
+                finally:
+                    write_lock.release()
+        finally:
+            conx.close()
 
     def disconnect(self):
-        if not self._conx:
+        if not self._connected:
             raise ex.ConnectionError('Database not connected')
-        self._c.close()
-        self._conx.close()
+        self._connected = False
+        with self._connections_lock:
+            for conx in self._connections:
+                if self.group_commit is not None or self.group_interval is not None:
+                    conx.commit()  # Pending group commits
+                conx.close()
+            del self._connections[:]
+        if self.threaded:
+            # Discard the connections of every thread
+            self._local = threading.local()
         self._conx = None
         self._c = None
+        self._transaction_level = 0
+        if self._write_lock.locked():
+            self._write_lock.release()
         return self
 
     # Simplified SQL interface
@@ -51,24 +218,99 @@ class SQLiteDB(BaseDB):
         :return: Result of the SQL query.
         """
         # query = query.replace('[db]', self.name)
+        if self.threaded and query.split(None, 1)[0].lower() in self._write_statements:
+            with self._writing():
+                return self._c.execute(query, pars or ()).fetchall()
         if pars:
             return self._c.execute(query, pars).fetchall()
         else:
             return self._c.execute(query).fetchall()
 
+    def executemany(self, query, pars):
+        """
+        Execute an sql query once for each set of parameters.
+
+        :param query: (str) SQL query
+        :param pars: (list of lists) Parameters required by each execution of the SQL query.
+        """
+        if self.threaded:
+            with self._writing():
+                self._c.executemany(query, pars)
+        else:
+            self._c.executemany(query, pars)
+
     def commit(self):
         self._conx.commit()
+        self._group_reset_()
+        self._release_write_()
         return self
 
     def rollback(self):
         self._conx.rollback()
+        self._invalidate_()
+        self._group_reset_()
+        self._release_write_()
         return self
 
-    def exists(self):
+    def pragmas(self):
+        """
+        :return: (dict) Current value of the performance related pragmas of the connection (journal mode,
+            synchronous, mmap and cache sizes, temp store, busy timeout), and of any pragma set on connect.
+        """
+        names = list(self._diagnostic_pragmas) + [p for p in self._pragmas if p not in self._diagnostic_pragmas]
+        values = {}
+        for name in names:
+            rows = self.execute('pragma {}'.format(name))
+            values[name] = rows[0][0] if len(rows) > 0 else None
+        return values
+
+    def _check_cache_(self):
+        """
+        Discard the object cache if another connection (e.g. another process) committed changes to the database
+        file since the last check, as reported by 'pragma data_version'.
+        """
+        version = self._c.execute('pragma data_version').fetchone()[0]
+        if getattr(self._local, 'data_version', None) != version:
+            self._invalidate_()
+            self._local.data_version = version
+
+    @contextlib.contextmanager
+    def _writing(self):
+        """
+        Context acquiring the write lock for the current thread (threaded mode). The lock is kept until the
+        current transaction finishes (see SQLiteDB.commit and SQLiteDB.rollback), and released straight away if the
+        statement did not open a transaction.
+        """
+        if not getattr(self._local, 'writing', False):
+            self._write_lock.acquire()
+            self._local.writing = True
+        try:
+            yield
+        finally:
+            if not self._conx.in_transaction:
+                self._release_write_()
+
+    def _release_write_(self):
+        if getattr(self._local, 'writing', False):
+            self._local.writing = False
+            self._write_lock.release()
+
+    def exists(self, table=None):
         return self.execute(
-            "select count(*) from sqlite_master where type='table' and name='{}'".format(self.name))[0][0] == 1
+            "select count(*) from sqlite_master where type='table' and name=?", (table or self.name, ))[0][0] == 1
+
+    def indexes(self):
+        return [r[0] for r in self.execute(
+            "select name from sqlite_master where type='index' and tbl_name=?", (self.name, ))]
+
+    def columns(self):
+        return [r[1] for r in self.execute("pragma table_info('{}')".format(self.name))]
 
     def rm(self):
         """Remove database from system: i.e. delete SQLite database file"""
         self.disconnect()
         os.remove(self.file)
+
+
+class _ThreadOwner:
+    """Held in the local data of a thread, which owns the thread's connection (see SQLiteDB._open)"""
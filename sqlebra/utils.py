@@ -1,5 +1,9 @@
 import random
 import string
+import collections
+import functools
+import hashlib
+import threading
 from . import exceptions as mis
 # from sqlebra.sqlite import sqlitedb
 
@@ -27,3 +31,92 @@ def row2value(db, row):
     for k in mis.py2sqlebra_multi.keys():
         if k.__name__ == row[class_name_ind]:
             return mis.py2sqlebra_multi[k].row2value(db, row)
+
+
+# Content hash of values which do not support one (e.g. numpy arrays). Never equal to the hash of a searched value.
+NO_HASH = 0
+
+
+def content_hash(class_name, payload):
+    """
+    Structural content hash of a value, stored in the 'hash' column (see BaseDB.content_hash)
+
+    :param class_name: (str) Name of the python class of the value
+    :param payload: (str) Representation of the content of the value
+    :return: (int) Signed 64 bit hash, never equal to NO_HASH
+    """
+    digest = hashlib.blake2b('{}:{}'.format(class_name, payload).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True) or 1
+
+
+def operation(method):
+    """
+    Decorator of the methods writing a whole value to the database, i.e. logical operations made of several writes
+    (see BaseDB._operation_). Decorates methods of SQLebra objects and of database handlers.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        return getattr(self, 'db', self)._operation_(method, self, *args, **kwargs)
+    return wrapper
+
+
+class LRUCache:
+    """
+    Size bounded mapping which discards the least recently used entries. Safe to share between threads.
+    """
+
+    def __init__(self, maxsize=128, on_evict=None):
+        """
+        :param maxsize: (int) Maximum number of entries held.
+        :param on_evict: (callable) Called with (key, value) of each evicted entry.
+        """
+        self.maxsize = maxsize
+        self.on_evict = on_evict
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Return the value of 'key', or 'default' if not cached"""
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                evicted = self._data.popitem(last=False)
+                self.evictions += 1
+            else:
+                evicted = None
+        if evicted is not None and self.on_evict is not None:
+            self.on_evict(*evicted)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def info(self):
+        """Return a dictionary with the cache statistics"""
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'size': len(self._data), 'maxsize': self.maxsize}
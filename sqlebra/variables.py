@@ -11,5 +11,7 @@ COL_DICT = {
         'txt_val': 8,  # String value
         'children_id': 9,  # Children's object identifier
         'root': 10,  # Flag for a variable's root
-        'user_defined': 11  # Flag for user defined variables, as opposed to nested values
+        'user_defined': 11,  # Flag for user defined variables, as opposed to nested values
+        'blob_val': 12,  # Binary value
+        'hash': 13  # Content hash of the value
     }
@@ -0,0 +1,51 @@
+import unittest
+import os
+from sqlebra.sqlite import SQLiteDB as DB
+from sqlebra.dtype import bytes_ as SQLbytes
+from sqlebra import exceptions as ex
+
+FILE = 'unittest.sqlebra.db'
+
+
+class TestInit(unittest.TestCase):
+
+    value = b'test'
+
+    @classmethod
+    def setUpClass(cls):
+        cls.dbfile = DB(FILE, mode='w').open()
+
+    def test_1_set(self):
+        self.dbfile['A'] = self.value
+        self.assertEqual([(0, 'A', 'bytes', None, None, None, None, None, None, None, 1, 1, self.value,
+                           SQLbytes.content_hash(self.value))],
+                         self.dbfile.select(where={'id': 0}))
+
+    def test_2_get(self):
+        self.assertIsInstance(self.dbfile['A'], SQLbytes)
+
+    def test_3_py(self):
+        self.assertEqual(self.value, self.dbfile['A'].py)
+
+    def test_4_edit(self):
+        self.dbfile['A'].py = b'edit'
+        self.assertEqual(b'edit', self.dbfile['A'].py)
+
+    def test_5_delete(self):
+        self.dbfile['A'].delete()
+        with self.assertRaises(ex.VariableError):
+            self.dbfile['A']
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.dbfile.disconnect()
+        os.remove(FILE)
+
+
+if __name__ == '__main__':
+    try:
+        unittest.main()
+    except Exception as e:
+        if os.path.exists(FILE):
+            os.remove(FILE)
+        raise e
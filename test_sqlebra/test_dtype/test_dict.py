@@ -140,6 +140,18 @@ class TestNested(unittest.TestCase):
     def test_02_1_py_item(self):
         self.assertEqual(self.x[0]['a'], self.x[1]['a'].py)
 
+    def test_02_2_items(self):
+        self.assertEqual(3, len(self.x[1].items()))
+        self.assertEqual(list(self.x[0].items()), [(key, value.py) for key, value in self.x[1].items()])
+        self.assertEqual(list(self.x[0].keys()), list(self.x[1].keys()))
+        self.assertIsInstance(next(iter(self.x[1].values())), SQLdict)
+
+    def test_02_3_values_in(self):
+        self.assertIn({'a1': 0, 'a2': 1, 'a3': 2}, self.x[1].values())
+        self.assertIn(6, self.x[1].values())
+        self.assertNotIn({'a1': 0}, self.x[1].values())
+        self.assertNotIn(6.0, self.x[1].values())
+
     def test_03_edit(self):
         self.x[0] = {'A': {'A1': 20, 'A2': 21, 'A3': 22},
                      'B': {'B1': 24, 'B2': 25},
@@ -17,7 +17,8 @@ class TestInit(unittest.TestCase):
 
     def test_1_set(self):
         self.dbfile['A'] = self.value
-        self.assertEqual([(0, 'A', 'float', None, None, None, None, self.value, None, None, 1, 1)],
+        self.assertEqual([(0, 'A', 'float', None, None, None, None, self.value, None, None, 1, 1, None,
+                           SQLfloat.content_hash(self.value))],
                          self.dbfile.select(where={'id': 0}))
 
     def test_2_get(self):
@@ -117,6 +117,21 @@ class TestSingle(unittest.TestCase):
         for x0, x1 in zip(self.x[0], self.x[1]):
             self.assertEqual(x0, x1.py)
 
+    def test_12_1_sort(self):
+        for xn in self.x:
+            xn.sort()
+        self.assertEqual(self.x[0], self.x[1].py)
+        for xn in self.x:
+            xn.sort(reverse=True)
+        self.assertEqual(self.x[0], self.x[1].py)
+
+    def test_12_2_sorted_view(self):
+        view = self.x[1].sorted_view()
+        self.assertEqual(len(self.x[0]), len(view))
+        self.assertEqual(sorted(self.x[0]), [item.py for item in view])
+        # The list is not rewritten
+        self.assertEqual(self.x[0], self.x[1].py)
+
     def test_99_delete(self):
         self.x[1].delete()
         with self.assertRaises(ex.VariableError):
@@ -128,6 +143,95 @@ class TestSingle(unittest.TestCase):
         os.remove(FILE)
 
 
+class TestSlice(unittest.TestCase):
+
+    value = [0, 1, 2, [3, 4], 4, {'a': 5}, 6, 7, 8, 9, 10, 11]
+    layout = None
+
+    @classmethod
+    def setUpClass(cls):
+        cls.dbfile = DB(FILE, mode='w', list_layout=cls.layout).open()
+        cls.dbfile['A'] = cls.value
+
+    def test_1_slice(self):
+        x = self.dbfile['A']
+        for s in (slice(None), slice(2, 7), slice(5, None), slice(None, 4), slice(-5, -1), slice(-100, 100),
+                  slice(1, 11, 3), slice(None, None, 2), slice(-2, 1, -3), slice(None, None, -1), slice(7, 2),
+                  slice(20, 30), slice(3, 3)):
+            self.assertEqual(self.value[s], [item.py for item in x[s]])
+        with self.assertRaises(ValueError):
+            x[::0]
+
+    def test_2_lazy(self):
+        view = self.dbfile['A'].slice(2, 10, 2, lazy=True)
+        self.assertEqual(4, len(view))
+        self.assertEqual(self.value[2:10:2], view.py)
+        self.assertEqual(self.value[2:10:2], [item.py for item in view])
+
+    def test_3_list_index(self):
+        self.assertEqual([1, 2], [item.py for item in self.dbfile['A'][[1, -10]]])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.dbfile.disconnect()
+        os.remove(FILE)
+
+
+class TestSliceSparse(TestSlice):
+
+    layout = 'sparse'
+
+
+class TestSort(unittest.TestCase):
+
+    def setUp(self):
+        self.dbfile = DB(FILE, mode='w').open()
+
+    def _test_sort(self, value, **kwargs):
+        self.dbfile['A'] = value
+        self.assertEqual(sorted(value, **kwargs), [item.py for item in self.dbfile['A'].sorted_view(**kwargs)])
+        self.dbfile['A'].sort(**kwargs)
+        value.sort(**kwargs)
+        self.assertEqual([(type(x), x) for x in value], [(type(x), x) for x in self.dbfile['A'].py])
+
+    def test_numbers(self):
+        # Stable, also in reverse order
+        for reverse in (False, True):
+            self._test_sort([3, 1.5, True, 2, 1, -0.5, 1.0, False], reverse=reverse)
+
+    def test_str(self):
+        self._test_sort(['b', 'B', 'a', 'ab', '', 'é'])
+
+    def test_bytes(self):
+        self._test_sort([b'b', b'a\x00', b'a', b''])
+
+    def test_mixed(self):
+        for value in ([1, 'a'], [b'a', 'a'], [None, None], [None, 1]):
+            self.dbfile['A'] = value
+            with self.assertRaises(TypeError):
+                self.dbfile['A'].sort()
+            with self.assertRaises(TypeError):
+                list(self.dbfile['A'].sorted_view())
+
+    def test_nested(self):
+        # Sorted in python
+        self.dbfile['A'] = [[2], [1, 2], [1]]
+        self.dbfile['A'].sort()
+        self.assertEqual([[1], [1, 2], [2]], self.dbfile['A'].py)
+        with self.assertRaises(TypeError):
+            list(self.dbfile['A'].sorted_view())
+
+    def test_key(self):
+        # Sorted in python
+        self.dbfile['A'] = ['b', 'C', 'a']
+        self.dbfile['A'].sort(key=str.lower, reverse=True)
+        self.assertEqual(['C', 'b', 'a'], self.dbfile['A'].py)
+
+    def tearDown(self):
+        self.dbfile.disconnect()
+        os.remove(FILE)
+
+
 class TestNested(unittest.TestCase):
 
     @classmethod
@@ -147,6 +251,20 @@ class TestNested(unittest.TestCase):
     def test_02_1_py_item(self):
         self.assertEqual(self.x[0][0], self.x[1][0].py)
 
+    def test_02_2_iter(self):
+        items = list(self.x[1])
+        self.assertIsInstance(items[0], SQLlist)
+        self.assertEqual(self.x[0], [item.py for item in items])
+
+    def test_02_3_iter_batches(self):
+        self.dbfile['B'] = list(range(10))
+        self.dbfile.stream_size = 3
+        try:
+            self.assertEqual(list(range(10)), [item.py for item in self.dbfile['B']])
+        finally:
+            del self.dbfile.stream_size
+            self.dbfile['B'].delete()
+
     def test_03_edit(self):
         self.x[0] = [[20, 21, 22], [23, 24], 25]
         self.x[1].py = self.x[0]
@@ -157,12 +275,95 @@ class TestNested(unittest.TestCase):
             xn[0] = 100
         self.assertEqual(self.x[0], self.x[1].py)
 
+    def test_04_index(self):
+        self.x[0] = [[1, 2], {'a': [3]}, (4, 5), 6]
+        self.x[1].py = self.x[0]
+        for value in self.x[0]:
+            self.assertEqual(self.x[0].index(value), self.x[1].index(value))
+            self.assertIn(value, self.x[1])
+        self.assertNotIn([2, 1], self.x[1])
+        self.assertNotIn([4, 5], self.x[1])  # Types must also match
+        with self.assertRaises(ValueError):
+            self.x[1].index([1, 2, 3])
+
+    def test_05_count(self):
+        for xn in self.x:
+            xn.append([1, 2])
+        self.assertEqual(self.x[0].count([1, 2]), self.x[1].count([1, 2]))
+
+    def test_06_stale(self):
+        # Writing to a nested value discards the hash of every value containing it
+        self.x[0][1]['a'].append(7)
+        self.x[1][1]['a'].append(7)
+        self.x[0][0][1] = 20
+        self.x[1][0][1] = 20
+        self.assertEqual(1, self.x[1].index({'a': [3, 7]}))
+        self.assertNotIn({'a': [3]}, self.x[1])
+        self.assertEqual(0, self.x[1].index([1, 20]))
+        self.assertEqual(1, self.x[1].count([1, 2]))
+
+    def test_07_remove(self):
+        for xn in self.x:
+            xn.remove([1, 2])
+            xn.remove({'a': [3, 7]})
+        self.assertEqual(self.x[0], self.x[1].py)
+
     @classmethod
     def tearDownClass(cls):
         cls.dbfile.disconnect()
         os.remove(FILE)
 
 
+class TestSingleSparse(TestSingle):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.dbfile = DB(FILE, mode='w', list_layout='sparse').open()
+        value = [10, 11, 12]
+        cls.dbfile['A'] = value
+        cls.x = [value, cls.dbfile['A']]
+
+    def test_00_layout(self):
+        self.assertEqual('sparse', self.x[1].layout)
+        self.assertEqual([0, SQLlist.gap, 2 * SQLlist.gap],
+                         [r[0] for r in self.dbfile.select(column=('ind', ), where={'id': 0, 'root': False})])
+
+    def test_07_1_insert_untouched(self):
+        inds = [r[0] for r in self.dbfile.select(column=('ind', ), where={'id': 0, 'root': False}, order=('ind', ))]
+        for xn in self.x:
+            xn.insert(1, 8)
+            xn.insert(0, 9)
+            xn.insert(-1, 4)
+        self.assertEqual(self.x[0], self.x[1].py)
+        # Existing items keep their 'ind'
+        new_inds = [r[0] for r in self.dbfile.select(column=('ind', ), where={'id': 0, 'root': False}, order=('ind', ))]
+        self.assertTrue(set(inds) <= set(new_inds))
+
+    def test_07_2_insert_renumber(self):
+        # Halve the room between the first two items until none is left
+        for n in range(20):
+            for xn in self.x:
+                xn.insert(1, n)
+        self.assertEqual(self.x[0], self.x[1].py)
+        self.assertEqual(self.x[0], [self.x[1][i].py for i in range(len(self.x[0]))])
+        self.assertEqual(self.x[0][-3:], [self.x[1][i].py for i in (-3, -2, -1)])
+
+    def test_13_nested(self):
+        self.x[0][2] = [1, [2, 3]]
+        self.x[1][2] = [1, [2, 3]]
+        self.x[0].insert(2, {'a': 1})
+        self.x[1].insert(2, {'a': 1})
+        self.assertEqual(self.x[0], self.x[1].py)
+        self.assertEqual(self.x[0][3], self.x[1][3].py)
+
+    def test_14_renumber(self):
+        self.x[1].renumber()
+        self.assertEqual(self.x[0], self.x[1].py)
+        self.assertEqual([i * SQLlist.gap for i in range(len(self.x[0]))],
+                         [r[0] for r in self.dbfile.select(column=('ind', ), where={'id': 0, 'root': False},
+                                                           order=('ind', ))])
+
+
 class TestEmpty(unittest.TestCase):
 
     @classmethod
@@ -178,6 +379,9 @@ class TestEmpty(unittest.TestCase):
     def test_3_py(self):
         self.assertEqual([], self.dbfile['A'].py)
 
+    def test_4_iter(self):
+        self.assertEqual([], list(self.dbfile['A']))
+
     @classmethod
     def tearDownClass(cls):
         cls.dbfile.disconnect()
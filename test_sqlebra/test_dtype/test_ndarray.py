@@ -189,6 +189,125 @@ class TestNested(unittest.TestCase):
         cls.dbfile.rm()
 
 
+class TestBlob(unittest.TestCase):
+
+    value = np.array([[1.5, 2.5, 3.5], [4.5, 5.5, 6.5]])
+
+    @classmethod
+    def setUpClass(cls):
+        cls.dbfile = DB(FILE, mode='w', ndarray_layout='blob').open()
+        cls.dbfile['A'] = cls.value.copy()
+        cls.x = [cls.value.copy(), cls.dbfile['A']]
+
+    def test_01_set(self):
+        # Root, dtype, shape and data rows
+        self.assertEqual(4, len(self.dbfile.select(where={'id': 0})))
+        self.assertEqual('blob', self.x[1].layout)
+
+    def test_02_py_01(self):
+        self.assertEqual(self.x[0].dtype, self.x[1].py.dtype)
+        self.assertListEqual(self.x[0].tolist(), self.x[1].py.tolist())
+
+    def test_02_py_02_item(self):
+        self.assertEqual(self.x[0][1, 2], self.x[1][1, 2].py)
+
+    def test_02_py_03_slice(self):
+        self.assertListEqual(self.x[0][:, 1:].tolist(), self.x[1][:, 1:].py.tolist())
+
+    def test_03_edit_01_item(self):
+        for xn in self.x:
+            xn[0, 1] = 100
+        self.assertListEqual(self.x[0].tolist(), self.x[1].py.tolist())
+
+    def test_03_edit_02_slice(self):
+        for xn in self.x:
+            xn[1] = [7, 8, 9]
+        self.assertListEqual(self.x[0].tolist(), self.x[1].py.tolist())
+
+    def test_03_edit_03(self):
+        self.x[0] = np.arange(10, dtype=np.int32)
+        self.x[1].py = self.x[0]
+        self.assertEqual(self.x[0].dtype, self.x[1].py.dtype)
+        self.assertListEqual(self.x[0].tolist(), self.x[1].py.tolist())
+
+    def test_04_len(self):
+        self.assertEqual(len(self.x[0]), len(self.x[1]))
+
+    def test_05_object_dtype(self):
+        # Arrays of python objects fall back to one row per element
+        self.dbfile['B'] = np.array([1, 'a'], dtype=object)
+        self.assertIsNone(self.dbfile['B'].layout)
+        self.assertListEqual([1, 'a'], self.dbfile['B'].py.tolist())
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.dbfile.rm()
+
+
+class TestChunk(unittest.TestCase):
+
+    value = np.arange(35, dtype=float).reshape(5, 7)
+
+    @classmethod
+    def setUpClass(cls):
+        cls.dbfile = DB(FILE, mode='w', ndarray_layout='chunk', ndarray_chunks=(2, 3),
+                        ndarray_compression='zlib').open()
+        cls.dbfile['A'] = cls.value.copy()
+        cls.x = [cls.value.copy(), cls.dbfile['A']]
+
+    def test_01_set(self):
+        # 3 x 3 grid of tiles
+        self.assertEqual(9, len(self.dbfile.select(where={'id': 0, '*': 'ind is not NULL'})))
+        self.assertEqual('chunk', self.x[1].layout)
+
+    def test_02_py_01(self):
+        self.assertListEqual(self.x[0].tolist(), self.x[1].py.tolist())
+
+    def test_02_py_02_item(self):
+        self.assertEqual(self.x[0][3, 4], self.x[1][3, 4].py)
+
+    def test_02_py_03_slice(self):
+        for n0 in range(self.x[0].shape[0]):
+            for n1 in range(self.x[0].shape[1]):
+                self.assertListEqual(self.x[0][n0:, n1:n1 + 3].tolist(), self.x[1][n0:, n1:n1 + 3].py.tolist())
+
+    def test_03_edit_01_item(self):
+        for xn in self.x:
+            xn[4, 6] = 100
+        self.assertListEqual(self.x[0].tolist(), self.x[1].py.tolist())
+
+    def test_03_edit_02_slice(self):
+        for xn in self.x:
+            xn[1:3] = 99
+        self.assertListEqual(self.x[0].tolist(), self.x[1].py.tolist())
+
+    def test_03_edit_03_slice(self):
+        with self.assertRaises(ValueError):
+            self.x[1][0] = [10, 20, 'a', 1, 2, 3, 4]
+        self.assertListEqual(self.x[0].tolist(), self.x[1].py.tolist())
+
+    def test_04_len(self):
+        self.assertEqual(len(self.x[0]), len(self.x[1]))
+
+    def test_05_object_dtype(self):
+        # Arrays of python objects fall back to one row per element
+        self.dbfile['B'] = np.array([[1, 'a'], [None, 2.5]], dtype=object)
+        self.assertIsNone(self.dbfile['B'].layout)
+        self.assertListEqual([[1, 'a'], [None, 2.5]], self.dbfile['B'].py.tolist())
+
+    def test_06_ndim(self):
+        # Arrays with a different number of dimensions than ndarray_chunks use the default tiles
+        for value in (np.arange(10.), np.arange(24.).reshape(2, 3, 4)):
+            self.dbfile['C'] = value
+            self.assertEqual('chunk', self.dbfile['C'].layout)
+            self.assertListEqual(value.tolist(), self.dbfile['C'].py.tolist())
+            self.assertListEqual(value[1:].tolist(), self.dbfile['C'][1:].py.tolist())
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.dbfile.rm()
+
+
 class TestStructured: # (unittest.TestCase):
 
     @classmethod
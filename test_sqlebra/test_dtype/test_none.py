@@ -14,7 +14,8 @@ class TestInit(unittest.TestCase):
 
     def test_1_set(self):
         self.dbfile['A'] = None
-        self.assertEqual([(0, 'A', 'NoneType', None, None, None, None, None, None, None, 1, 1)],
+        self.assertEqual([(0, 'A', 'NoneType', None, None, None, None, None, None, None, 1, 1, None,
+                           SQLNone.content_hash(None))],
                          self.dbfile.select(where={'id': 0}))
 
     def test_2_get(self):
@@ -23,6 +23,10 @@ class TestInit(unittest.TestCase):
         with self.assertRaises(TypeError):
             self.dbfile['A'][0] = 10
 
+    def test_4_slice(self):
+        self.assertEqual([11, 12], [item.py for item in self.dbfile['A'][1:]])
+        self.assertEqual((12, 10), self.dbfile['A'].slice(step=-2, lazy=True).py)
+
     @classmethod
     def tearDownClass(cls):
         cls.dbfile.disconnect()
@@ -1,9 +1,11 @@
 import unittest
 import os
+import numpy as np
 from sqlebra.sqlite import SQLiteDB as DB
 from sqlebra.dtype import dict_ as SQLdict
 from sqlebra.dtype import int_ as SQLint
 from sqlebra import exceptions as ex
+from sqlebra.database.dialect import MySQLDialect
 
 FILE = 'unittest.sqlebra.db'
 
@@ -81,12 +83,293 @@ class TestBaseDB_py(unittest.TestCase):
     def test_value(self):
         self.assertTrue(self.value, self.dbfile.py)
 
+    def test_value_equal(self):
+        self.assertEqual(self.value, self.dbfile.py)
+
+    def test_iter_names(self):
+        self.assertEqual(list(self.value.keys()), list(self.dbfile.iter_names()))
+
+    def test_iter_items(self):
+        self.assertEqual(list(self.value.items()), list(self.dbfile.iter_items()))
+
+    def test_iter_items_lazy(self):
+        items = list(self.dbfile.iter_items(lazy=True))
+        self.assertIsInstance(items[2][1], SQLdict)
+        self.assertEqual(list(self.value.items()), [(name, value.py) for name, value in items])
+
+    def test_single_query(self):
+        # Nested values are retrieved with a single query
+        value = {'a': [{'b': [1, 2]}, {'c': (3, {'d': None})}], 'e': True}
+        self.dbfile['D'] = value
+        queries = []
+        execute = self.dbfile.execute
+        self.dbfile.execute = lambda *args: queries.append(args) or execute(*args)
+        try:
+            self.assertEqual(value, self.dbfile['D'].py)
+            self.assertEqual(2, len(queries))  # Root row and nested values
+        finally:
+            del self.dbfile.execute
+            self.dbfile['D'].delete()
+
     @classmethod
     def tearDownClass(cls):
         cls.dbfile.disconnect()
         os.remove(FILE)
 
 
+class TestBaseDB_Cache(unittest.TestCase):
+
+    def setUp(self):
+        self.dbfile = DB(FILE, mode='w', cache_size=4).open()
+        self.dbfile['config'] = {'threshold': 10, 'name': 'a'}
+        self.queries = []
+        execute = self.dbfile.execute
+        self.dbfile.execute = lambda *args: self.queries.append(args) or execute(*args)
+
+    def test_hits(self):
+        self.assertEqual(10, self.dbfile['config']['threshold'].py)
+        n = len(self.queries)
+        self.assertEqual(10, self.dbfile['config']['threshold'].py)
+        self.assertEqual(n, len(self.queries))
+        self.assertEqual(2, self.dbfile.cache_info()['hits'])
+
+    def test_invalidate(self):
+        self.assertEqual(10, self.dbfile['config']['threshold'].py)
+        self.dbfile['config']['threshold'] = 20
+        self.assertEqual(20, self.dbfile['config']['threshold'].py)
+        self.dbfile['config']['new'] = [1, 2]
+        self.assertEqual([1, 2], self.dbfile['config']['new'].py)
+        self.dbfile['config'].pop('threshold')
+        self.assertNotIn('threshold', self.dbfile['config'].py)
+        self.dbfile['config'] = 1
+        self.assertEqual(1, self.dbfile['config'].py)
+
+    def test_rollback(self):
+        self.dbfile.commit()
+        self.dbfile['config']['threshold'] = 20
+        self.assertEqual(20, self.dbfile['config']['threshold'].py)
+        self.dbfile.rollback()
+        self.assertEqual(10, self.dbfile['config']['threshold'].py)
+
+    def test_other_connection(self):
+        self.assertEqual(10, self.dbfile['config']['threshold'].py)
+        self.dbfile.commit()
+        # No changes made by other connections
+        self.assertEqual(10, self.dbfile['config']['threshold'].py)
+        self.assertEqual(2, self.dbfile.cache_info()['hits'])
+        # Changes made by another connection discard the cache
+        writer = DB(FILE).open()
+        writer['config']['threshold'] = 20
+        writer.commit()
+        writer.disconnect()
+        self.assertEqual(20, self.dbfile['config']['threshold'].py)
+
+    def test_inserts(self):
+        # Selections which are neither by id nor by name gain rows on inserts, and are not cached
+        self.assertEqual(1, len(self.dbfile[{'root': True, 'user_defined': True}][2]))
+        self.dbfile['b'] = 2
+        self.assertEqual(2, len(self.dbfile[{'root': True, 'user_defined': True}][2]))
+
+    def test_evictions(self):
+        for i in range(6):
+            self.dbfile['v{}'.format(i)] = i
+            self.assertEqual(i, self.dbfile['v{}'.format(i)].py)
+        self.assertEqual(4, self.dbfile.cache_info()['size'])
+        self.assertGreater(self.dbfile.cache_info()['evictions'], 0)
+
+    def tearDown(self):
+        del self.dbfile.execute
+        self.dbfile.disconnect()
+        os.remove(FILE)
+
+
+class TestBaseDB_Hash(unittest.TestCase):
+
+    value = [[1, 2], {'a': (3, b'4'), 'b': None}, 5.0, 'six', True]
+
+    def setUp(self):
+        self.dbfile = DB(FILE, mode='w').open()
+        self.dbfile['A'] = self.value
+
+    def test_content_hash(self):
+        # Stored hashes match the hashes of the python values
+        self.assertEqual(self.dbfile.content_hash(self.value),
+                         self.dbfile.select(column=('hash', ), where={'id': 0, 'root': True})[0][0])
+        self.assertEqual([self.dbfile.content_hash(x) for x in self.value],
+                         [r[0] for r in self.dbfile.select(column=('hash', ), where={'id': 0, 'root': False})])
+        self.assertNotEqual(self.dbfile.content_hash([1, 2]), self.dbfile.content_hash((1, 2)))
+        self.assertEqual(self.dbfile.content_hash({'a': 1, 'b': 2}), self.dbfile.content_hash({'b': 2, 'a': 1}))
+
+    def test_layout(self):
+        # Hashes do not depend on the storage layout
+        self.dbfile.layouts['list'] = 'sparse'
+        self.dbfile['B'] = self.value
+        hashes = self.dbfile.select(column=('hash', ), where={'root': True, 'name': ['A', 'B']})
+        self.assertEqual(hashes[0], hashes[1])
+
+    def test_rehash(self):
+        # Variables stored without hashes (e.g. by older versions of SQLebra)
+        hashes = self.dbfile.select(column=('hash', ), where={'id': 0}, order=('ind', ))
+        self.dbfile.update(set={'hash': None}, where={})
+        self.assertEqual(1, self.dbfile['A'].index({'b': None, 'a': (3, b'4')}))
+        self.assertEqual(hashes, self.dbfile.select(column=('hash', ), where={'id': 0}, order=('ind', )))
+
+    def test_unsupported(self):
+        with self.assertRaises(TypeError):
+            self.dbfile['A'].index(np.zeros(2))
+
+    def test_clear(self):
+        # Clearing a nested value discards the hashes of the values containing it
+        x = self.dbfile['A']
+        x[0].clear()
+        self.assertNotIn([1, 2], x)
+        self.assertIn([], x)
+        x[1]['a'].clear()
+        self.assertEqual(1, x.index({'a': (), 'b': None}))
+
+    def test_stale_transaction(self):
+        # Discarding hashes is part of the write transaction
+        self.dbfile.commit()
+        self.dbfile._nested_write_(0)
+        self.assertTrue(self.dbfile._conx.in_transaction)
+        self.dbfile.rollback()
+        self.assertIsNotNone(self.dbfile.select(column=('hash', ), where={'id': 0, 'root': True})[0][0])
+
+    def tearDown(self):
+        self.dbfile.disconnect()
+        os.remove(FILE)
+
+
+class TestBaseDB_Dedup(unittest.TestCase):
+
+    cfg = {'a': [1, 2, 3], 'b': 'text'}
+
+    def setUp(self):
+        self.dbfile = DB(FILE, mode='w', dedup=True).open()
+        self.dbfile['A'] = [self.cfg] * 100
+
+    def count(self):
+        return self.dbfile.select(column=('count(*)', ), where={})[0][0]
+
+    def test_storage(self):
+        # 1 root and 100 items for A, 3 rows for cfg and 4 rows for cfg['a']
+        self.assertEqual(108, self.count())
+        self.assertEqual([self.cfg] * 100, self.dbfile['A'].py)
+        # Values are also shared with new variables
+        self.dbfile['B'] = {'x': self.cfg}
+        self.assertEqual(110, self.count())
+        self.assertEqual({'x': self.cfg}, self.dbfile['B'].py)
+
+    def test_no_dedup(self):
+        self.dbfile.dedup = False
+        self.dbfile['B'] = [self.cfg] * 2
+        self.assertEqual(108 + 3 + 2 * 7, self.count())
+
+    def test_delete(self):
+        # Shared values are deleted along with their last reference
+        x = self.dbfile['A']
+        self.assertEqual(self.cfg, x.pop(0))
+        self.assertEqual(107, self.count())
+        x.py = [self.cfg, 0]
+        self.assertEqual(1 + 2 + 7, self.count())
+        x.pop(0)
+        self.assertEqual(2, self.count())
+        self.dbfile['A'] = [self.cfg] * 100
+        self.dbfile['A'].delete()
+        self.assertEqual(0, self.count())
+
+    def test_delete_shared(self):
+        # Values shared with other variables are kept
+        self.dbfile['a'] = [{'x': 1}, {'x': 1}]
+        self.dbfile['b'] = [{'x': 1}]
+        self.dbfile['a'] = 5
+        self.assertEqual([{'x': 1}], self.dbfile['b'].py)
+        self.dbfile['B'] = {'c': self.cfg}
+        self.dbfile['A'] = []
+        self.assertEqual({'c': self.cfg}, self.dbfile['B'].py)
+        self.dbfile['A'] = [self.cfg, self.cfg]
+        x = self.dbfile['A']
+        x.remove(self.cfg)
+        x.pop()
+        self.assertEqual({'c': self.cfg}, self.dbfile['B'].py)
+        x.append(self.cfg)
+        x[0] = 0
+        self.assertEqual({'c': self.cfg}, self.dbfile['B'].py)
+        x.append(self.cfg)
+        self.dbfile['B']['c'] = 1
+        self.dbfile['B'].pop('c')
+        self.assertEqual([0, self.cfg], x.py)
+        # Deleted with the last reference: 1 row for 'a', 4 for 'b' and its {'x': 1}, 2 for A and 1 for B
+        x.pop()
+        self.assertEqual(1 + 4 + 2 + 1, self.count())
+
+    def test_flag(self):
+        # Files holding shared values are protected by handlers opened without dedup
+        self.dbfile.commit()
+        self.dbfile.disconnect()
+        self.dbfile = DB(FILE).open()
+        with self.assertRaises(ex.SharedValueError):
+            self.dbfile['A'][0]['b'] = 'other'
+        self.dbfile['A'].pop()
+        self.assertEqual(108 - 1, self.count())
+        # Other files skip the checks
+        other = DB('other.' + FILE, mode='w').open()
+        self.assertFalse(other._shared_values)
+        other.rm()
+
+    def test_write(self):
+        # Shared values cannot be written to
+        x = self.dbfile['A']
+        with self.assertRaises(ex.SharedValueError):
+            x[0]['b'] = 'other'
+        with self.assertRaises(ex.SharedValueError):
+            x[0]['a'].append(4)
+        with self.assertRaises(ex.SharedValueError):
+            x[0]['a'][0] = 0
+        with self.assertRaises(ex.SharedValueError):
+            x[0]['a'].clear()
+        with self.assertRaises(ex.SharedValueError):
+            x[0].clear()
+        self.assertEqual([self.cfg] * 100, x.py)
+        # Items holding them can be replaced
+        x[0] = {'a': [1, 2, 3], 'b': 'other'}
+        self.assertEqual('other', x[0]['b'].py)
+        self.assertEqual([self.cfg] * 99, x.py[1:])
+        self.assertEqual(0, x.index({'b': 'other', 'a': [1, 2, 3]}))
+        self.assertEqual(1, x.index(self.cfg))
+        # Values held once can be written to
+        x[0]['b'] = 'last'
+        self.assertEqual({'a': [1, 2, 3], 'b': 'last'}, x[0].py)
+
+    def tearDown(self):
+        self.dbfile.disconnect()
+        os.remove(FILE)
+
+
+class TestDialect(unittest.TestCase):
+
+    def setUp(self):
+        # Queries are built without connecting to the database
+        self.dbfile = DB(FILE, mode='w')
+        self.dbfile.dialect = MySQLDialect()
+
+    def test_select(self):
+        self.assertEqual('select child_id, `key` from sqlebra where id = %s and `key` in (%s, %s) and ind > %s '
+                         'order by `key` limit 1 offset %s',
+                         ' '.join(self.dbfile._build_select(('child_id', 'key'),
+                                                            {'id': 0, 'key': ['a', 'b'], '*': ('ind > ?', 1), 'rn': 2},
+                                                            ('key', )).split()))
+
+    def test_literal_values(self):
+        # Literal values are never rewritten
+        self.assertEqual('update sqlebra set txt_val = %s where `key` = %s',
+                         self.dbfile._build_update({'txt_val': 'monkey?'}, {'key': 'key?'}).strip())
+
+    def test_upsert(self):
+        self.assertEqual('insert ignore into t (name, value) values (%s, %s)',
+                         self.dbfile.dialect.upsert('t', ('name', 'value'), ('name', )))
+
+
 if __name__ == '__main__':
     try:
         unittest.main()
@@ -54,6 +54,16 @@ class Test1DBInit(unittest.TestCase):
         with self.assertRaises(FileExistsError):
             DB(self.file, mode='x')
 
+    def test_7_pool(self):
+        dbfile = DB(self.file, pool_size=2).connect()
+        conx = dbfile._conx
+        dbfile.disconnect()
+        # The connection is reused, already bound to the schema
+        dbfile = DB(self.file, pool_size=2).connect()
+        self.assertIs(conx, dbfile._conx)
+        self.assertEqual(self.file, dbfile.execute('select database()')[0][0])
+        dbfile.disconnect()
+
     @classmethod
     def tearDownClass(cls):
         DB(cls.file, mode='w').open().rm()
@@ -73,7 +83,7 @@ class TestDBInterface(unittest.TestCase):
     def test_2_select(self):
         row = self.dbfile.select(where={'id': 0})
         self.assertEqual(1, len(row))
-        self.assertEqual((0, None, None, None, 10, None, None, None, None, None, None, None), row[0])
+        self.assertEqual((0, None, None, None, 10, None, None, None, None, None, None, None, None, None), row[0])
 
     def test_3_delete(self):
         self.dbfile.delete(where={'id': 0})
@@ -0,0 +1,89 @@
+import unittest
+import os
+import sqlite3
+import threading
+from sqlebra.database.pool import ConnectionPool
+from sqlebra import exceptions as ex
+
+FILE = 'unittest.sqlebra.db'
+
+
+class TestConnectionPool(unittest.TestCase):
+    """SQLite connections stand in for a database server"""
+
+    def setUp(self):
+        self.opened = []
+        self.pool = ConnectionPool(self.connect, size=2, check=self.check, timeout=0.1)
+
+    def connect(self):
+        conx = sqlite3.connect(FILE, check_same_thread=False)
+        self.opened.append(conx)
+        return conx
+
+    @staticmethod
+    def check(conx):
+        return conx.execute('select 1').fetchone() == (1, )
+
+    def test_reuse(self):
+        conx = self.pool.acquire()
+        self.pool.release(conx)
+        self.assertIs(conx, self.pool.acquire())
+        self.assertEqual(1, len(self.opened))
+
+    def test_size(self):
+        conx = [self.pool.acquire(), self.pool.acquire()]
+        with self.assertRaises(ex.ConnectionError):
+            self.pool.acquire()
+        self.pool.release(conx[0])
+        self.assertIs(conx[0], self.pool.acquire())
+
+    def test_threads(self):
+        used = []
+
+        def work():
+            conx = self.pool.acquire()
+            used.append(conx)
+            self.pool.release(conx)
+
+        self.pool.timeout = None
+        threads = [threading.Thread(target=work) for _ in range(10)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(10, len(used))
+        self.assertLessEqual(len(self.opened), 2)
+
+    def test_health_check(self):
+        conx = self.pool.acquire()
+        self.pool.release(conx)
+        conx.close()
+        # Closed connections are replaced
+        self.assertIsNot(conx, self.pool.acquire())
+        self.assertEqual(2, len(self.opened))
+
+    def test_reset(self):
+        self.pool._reset = lambda conx: conx.rollback()
+        conx = self.pool.acquire()
+        conx.execute('create table if not exists t (a INTEGER)')
+        conx.execute('insert into t values (1)')
+        self.pool.release(conx)
+        self.assertEqual([], self.pool.acquire().execute('select * from t').fetchall())
+
+    def test_close(self):
+        conx = self.pool.acquire()
+        self.pool.close()
+        with self.assertRaises(ex.ConnectionError):
+            self.pool.acquire()
+        self.pool.release(conx)
+        self.assertEqual(0, self.pool.idle)
+
+    def tearDown(self):
+        for conx in self.opened:
+            conx.close()
+        if os.path.exists(FILE):
+            os.remove(FILE)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,10 @@
 import unittest
 import os
+import threading
+import gc
+import asyncio
 from sqlebra.sqlite import SQLiteDB as DB
+from sqlebra.sqlite import AsyncSQLiteDB as AsyncDB
 from sqlebra import exceptions as ex
 
 
@@ -67,13 +71,41 @@ class TestDBInterface(unittest.TestCase):
     def test_2_select(self):
         row = self.dbfile.select(where={'id': 0})
         self.assertEqual(1, len(row))
-        self.assertEqual((0, None, None, None, 10, None, None, None, None, None, None, None), row[0])
+        self.assertEqual((0, None, None, None, 10, None, None, None, None, None, None, None, None, None), row[0])
 
     def test_3_delete(self):
         self.dbfile.delete(where={'id': 0})
         row = self.dbfile.select(where={'id': 0})
         self.assertEqual(len(row), 0)
 
+    def test_4_insert_many(self):
+        self.dbfile.insert_many([{'id': 1, 'ind': 0, 'int_val': 10},
+                                 {'id': 1, 'ind': 1, 'txt_val': 'a'},
+                                 {'id': 1, 'ind': 2, 'int_val': 12}])
+        self.assertEqual([(0, 10, None), (1, None, 'a'), (2, 12, None)],
+                         self.dbfile.select(column=('ind', 'int_val', 'txt_val'), where={'id': 1}, order=('ind', )))
+        self.dbfile.delete(where={'id': 1})
+
+    def test_5_query_cache(self):
+        self.dbfile.insert_many([{'id': 2, 'ind': i, 'int_val': i} for i in range(5)])
+        self.dbfile._sql_cache.clear()
+        for ind in range(5):
+            self.assertEqual([(ind, )], self.dbfile.select(column=('int_val', ), where={'id': 2, 'ind': ind}))
+        self.assertEqual(1, len(self.dbfile._sql_cache))
+        # Lists and offsets are bound as values
+        self.assertEqual([(1, ), (3, )], self.dbfile.select(column=('int_val', ), where={'id': 2, 'ind': [1, 3]},
+                                                            order=('ind', )))
+        self.assertEqual([(2, ), (4, )], self.dbfile.select(column=('int_val', ), where={'id': 2, 'ind': [2, 4]},
+                                                            order=('ind', )))
+        self.assertEqual(2, len(self.dbfile._sql_cache))
+        self.assertEqual([(4, )], self.dbfile.select(column=('int_val', ), where={'id': 2, 'rn': 4}))
+        self.assertEqual([(4, )], self.dbfile.select(column=('int_val', ), where={'id': 2, '*': ('ind > ?', 3)}))
+        self.dbfile.update(set={'int_val': 10}, where={'id': 2, 'ind': [2, 4]})
+        self.assertEqual([(10, ), (10, )], self.dbfile.select(column=('int_val', ),
+                                                              where={'id': 2, 'ind': [2, 4]}, order=('ind', )))
+        self.dbfile.delete(where={'id': 2})
+        self.assertEqual([], self.dbfile.select(where={'id': 2}))
+
     def text_3_update(self):
         self.dbfile.update(set={'int_val': 2}, where={'id': 1})
         self.assertEqual(self.dbfile.select(column=('int_val', ), where={'id': 1})[0][0], 2,
@@ -82,11 +114,46 @@ class TestDBInterface(unittest.TestCase):
     def test_free_id(self):
         self.assertEqual(0, self.dbfile.free_id(True))
 
+    def test_free_id_sequence(self):
+        id = self.dbfile.free_id()
+        self.assertEqual(id + 1, self.dbfile.free_id())
+        self.assertEqual(id + 2, self.dbfile.free_id(n=3))
+        self.assertEqual(id + 5, self.dbfile.free_id())
+        self.dbfile.commit()
+
+    def test_free_id_connections(self):
+        # Ids reserved by one connection are not returned to another
+        dbfile2 = DB(self.file).open()
+        ids = [self.dbfile.free_id()]
+        self.dbfile.commit()
+        ids.append(dbfile2.free_id())
+        dbfile2.commit()
+        ids.append(self.dbfile.free_id())
+        self.dbfile.commit()
+        dbfile2.disconnect()
+        self.assertEqual(3, len(set(ids)))
+
     def test_free_name(self):
         name = self.dbfile.free_name()
         self.assertEqual(len(self.dbfile.select(where={'name': name})), 0,
                          'Existing name returned')
 
+    def test_free_names(self):
+        names = self.dbfile.free_names(3, prefix='x')
+        self.assertEqual(3, len(set(names)))
+        self.assertTrue(all(n.startswith('x$') for n in names))
+        self.assertNotIn(self.dbfile.free_name(prefix='x'), names)
+
+    def test_free_names_used(self):
+        # Names chosen by the user are skipped
+        first = int(self.dbfile.free_name(prefix='y').split('$')[1])
+        self.dbfile['y${}'.format(first + 1)] = 1
+        self.dbfile['y${}'.format(first + 3)] = 2
+        names = self.dbfile.free_names(3, prefix='y')
+        self.assertEqual(['y${}'.format(i) for i in (first + 2, first + 4, first + 5)], names)
+        self.dbfile['y${}'.format(first + 1)].delete()
+        self.dbfile['y${}'.format(first + 3)].delete()
+
     @classmethod
     def tearDownClass(cls):
         cls.dbfile.disconnect()
@@ -94,6 +161,303 @@ class TestDBInterface(unittest.TestCase):
         os.remove(cls.file)
 
 
+class TestDBIndexes(unittest.TestCase):
+
+    file = 'unittest.sqlebra.db'
+
+    def test_1_init(self):
+        dbfile = DB(self.file, mode='w').open()
+        self.assertTrue(set(dbfile._index_name(s) for s in dbfile._indexes).issubset(dbfile.indexes()))
+        dbfile.disconnect()
+
+    def test_2_upgrade(self):
+        # Database table created by an older version of SQLebra, with no indexes
+        dbfile = DB(self.file, mode='w').connect()
+        dbfile.execute('create table {} (id INTEGER, name TEXT, class TEXT, key TEXT, ind INTEGER, '
+                       'bool_val TINYINT(1), int_val INTEGER, real_val REAL, txt_val TEXT, child_id INTEGER, '
+                       'root TINYINT(1), user_defined TINYINT(1))'.format(dbfile.name))
+        dbfile.insert({'id': 4, 'name': 'A', 'class': 'int', 'int_val': 1, 'root': 1, 'user_defined': 1})
+        dbfile.commit()
+        self.assertEqual([], dbfile.indexes())
+        dbfile.disconnect()
+        # Columns and indexes are created when opened
+        dbfile = DB(self.file, mode='+').open()
+        self.assertEqual([c for c, _ in dbfile._columns], dbfile.columns())
+        self.assertTrue(set(dbfile._index_name(s) for s in dbfile._indexes).issubset(dbfile.indexes()))
+        # The id sequence starts after existing ids
+        self.assertEqual(5, dbfile.free_id())
+        self.assertEqual(1, dbfile['A'].py)
+        dbfile.disconnect()
+
+    def test_3_read(self):
+        # Database table created by an older version of SQLebra, opened to read: it is not upgraded
+        dbfile = DB(self.file, mode='w').connect()
+        dbfile.execute('create table {} (id INTEGER, name TEXT, class TEXT, key TEXT, ind INTEGER, '
+                       'bool_val TINYINT(1), int_val INTEGER, real_val REAL, txt_val TEXT, child_id INTEGER, '
+                       'root TINYINT(1), user_defined TINYINT(1))'.format(dbfile.name))
+        for row in [{'id': 0, 'name': 'A', 'class': 'list', 'root': 1, 'user_defined': 1},
+                    {'id': 0, 'name': 'A[0]', 'class': 'int', 'ind': 0, 'int_val': 1, 'root': 0, 'user_defined': 0},
+                    {'id': 0, 'name': 'A[1]', 'class': 'list', 'ind': 1, 'child_id': 1, 'root': 0,
+                     'user_defined': 0},
+                    {'id': 1, 'name': 'A[1]', 'class': 'list', 'root': 1, 'user_defined': 0},
+                    {'id': 1, 'name': 'A[1][0]', 'class': 'int', 'ind': 0, 'int_val': 2, 'root': 0,
+                     'user_defined': 0},
+                    {'id': 2, 'name': 'B', 'class': 'dict', 'root': 1, 'user_defined': 1},
+                    {'id': 2, 'name': "B['a']", 'class': 'int', 'key': 'a', 'int_val': 3, 'root': 0,
+                     'user_defined': 0}]:
+            dbfile.insert(row)
+        dbfile.commit()
+        dbfile.disconnect()
+        dbfile = DB(self.file, mode='r').open()
+        self.assertEqual(12, len(dbfile.columns()))
+        self.assertEqual([1, [2]], [x.py for x in dbfile['A']])
+        self.assertEqual([[2]], [x.py for x in dbfile['A'][1:]])
+        self.assertEqual([1], dbfile['A'].slice(0, 1, lazy=True).py)
+        self.assertEqual([3], [x.py for x in dbfile['B'].values()])
+        # Files without hashes are searched in python
+        self.assertEqual(1, dbfile['A'].index([2]))
+        self.assertEqual(1, dbfile['A'].count(1))
+        self.assertNotIn(True, dbfile['A'])
+        self.assertIn(3, dbfile['B'].values())
+        dbfile.disconnect()
+
+    def tearDown(self):
+        if os.path.exists(self.file):
+            os.remove(self.file)
+
+
+class TestDBThreaded(unittest.TestCase):
+
+    file = 'unittest.sqlebra.db'
+
+    @classmethod
+    def setUpClass(cls):
+        cls.dbfile = DB(cls.file, mode='w', threaded=True).open()
+        cls.dbfile['A'] = list(range(10))
+        cls.dbfile.commit()
+
+    def run_threads(self, target, n=8):
+        errors = []
+
+        def run(i):
+            try:
+                target(i)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run, args=(i, )) for i in range(n)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual([], errors)
+
+    def test_1_wal(self):
+        self.assertEqual('wal', self.dbfile.execute('pragma journal_mode')[0][0])
+
+    def test_2_read(self):
+        connections = []
+
+        def read(i):
+            connections.append(self.dbfile._conx)
+            self.assertEqual(list(range(10)), self.dbfile['A'].py)
+
+        self.run_threads(read)
+        self.assertEqual(8, len(set(map(id, connections))))
+
+    def test_3_write(self):
+        def write(i):
+            for j in range(5):
+                self.dbfile['T{}_{}'.format(i, j)] = [i, j]
+                self.dbfile.commit()
+
+        self.run_threads(write)
+        self.assertEqual([3, 4], self.dbfile['T3_4'].py)
+        self.assertEqual(41, len(self.dbfile))
+
+    def test_4_transaction(self):
+        def write(i):
+            with self.dbfile.transaction() as db:
+                db['X{}'.format(i)] = i
+                db['Y{}'.format(i)] = -i
+
+        self.run_threads(write)
+        self.assertEqual([-i for i in range(8)], [self.dbfile['Y{}'.format(i)].py for i in range(8)])
+
+    def test_5_cache(self):
+        dbfile = DB('cache.' + self.file, mode='w', threaded=True, cache_size=16).open()
+        try:
+            dbfile['C'] = 1
+            dbfile.commit()
+            # Another thread reads the committed value while this thread writes a new one
+            dbfile['C'] = 2
+            self.run_threads(lambda i: self.assertEqual(1, dbfile['C'].py), n=1)
+            self.assertEqual(2, dbfile['C'].py)
+            dbfile.commit()
+            self.assertEqual(2, dbfile['C'].py)
+            self.run_threads(lambda i: self.assertEqual(2, dbfile['C'].py), n=1)
+        finally:
+            dbfile.rm()
+
+    def test_6_thread_end(self):
+        # Connections are closed when their thread ends
+        self.run_threads(lambda i: self.dbfile['A'].py)
+        gc.collect()
+        self.assertEqual(1, len(self.dbfile._connections))
+        # Uncommitted writes are rolled back, and the write lock released
+        self.run_threads(lambda i: self.dbfile.__setitem__('Z', i), n=1)
+        gc.collect()
+        self.assertNotIn('Z', self.dbfile)
+        self.dbfile['Z'] = 1
+        self.dbfile.commit()
+        self.assertFalse(self.dbfile._write_lock.locked())
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.dbfile.disconnect()
+        os.remove(cls.file)
+        for ext in ('-wal', '-shm'):
+            if os.path.exists(cls.file + ext):
+                os.remove(cls.file + ext)
+
+
+class TestAsyncDB(unittest.IsolatedAsyncioTestCase):
+
+    file = 'unittest.sqlebra.db'
+
+    async def test_1_get_set(self):
+        async with AsyncDB(self.file, mode='w') as db:
+            await asyncio.gather(*(db.set('V{}'.format(i), [i, {'a': i}]) for i in range(10)))
+            self.assertEqual(10, await db.len())
+            self.assertEqual([3, {'a': 3}], await db.get('V3'))
+            self.assertEqual([[i, {'a': i}] for i in range(10)], await db.get_many(['V{}'.format(i) for i in range(10)]))
+            await db.delete('V0')
+            self.assertFalse(await db.contains('V0'))
+            self.assertEqual({'V{}'.format(i): [i, {'a': i}] for i in range(1, 10)}, await db.py())
+
+    async def test_2_event_loop(self):
+        # The event loop keeps running while the database is used
+        async with AsyncDB(self.file, mode='w', max_workers=2) as db:
+            ticks = []
+
+            async def tick():
+                for _ in range(5):
+                    ticks.append(1)
+                    await asyncio.sleep(0)
+
+            await asyncio.gather(db.set('A', list(range(1000))), tick())
+            self.assertEqual(5, len(ticks))
+            self.assertEqual(list(range(1000)), await db.get('A'))
+
+    def tearDown(self):
+        for ext in ('', '-wal', '-shm'):
+            if os.path.exists(self.file + ext):
+                os.remove(self.file + ext)
+
+
+class TestDBProfiles(unittest.TestCase):
+
+    file = 'unittest.sqlebra.db'
+
+    def test_default(self):
+        dbfile = DB(self.file, mode='w').open()
+        self.assertEqual('delete', dbfile.pragmas()['journal_mode'])
+        dbfile.disconnect()
+
+    def test_profiles(self):
+        for profile, pragmas in DB.PROFILES.items():
+            dbfile = DB(self.file, mode='w', profile=profile).open()
+            active = dbfile.pragmas()
+            for pragma in ('cache_size', 'mmap_size', 'busy_timeout'):
+                if pragma in pragmas:
+                    self.assertEqual(pragmas[pragma], active[pragma])
+            if 'journal_mode' in pragmas:
+                self.assertEqual(pragmas['journal_mode'].lower(), active['journal_mode'])
+            dbfile['A'] = 1
+            self.assertEqual(1, dbfile['A'].py)
+            dbfile.disconnect()
+
+    def test_pragmas(self):
+        dbfile = DB(self.file, mode='w', profile='durable', pragmas={'synchronous': 'OFF', 'foreign_keys': 1}).open()
+        self.assertEqual(0, dbfile.pragmas()['synchronous'])
+        self.assertEqual(1, dbfile.pragmas()['foreign_keys'])
+        dbfile.disconnect()
+
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            DB(self.file, mode='w', profile='unknown')
+        with self.assertRaises(ValueError):
+            DB(self.file, mode='w', pragmas={'synchronous = 0; drop table x': 1})
+
+    def tearDown(self):
+        for ext in ('', '-wal', '-shm'):
+            if os.path.exists(self.file + ext):
+                os.remove(self.file + ext)
+
+
+class TestDBGroupCommit(unittest.TestCase):
+
+    file = 'unittest.sqlebra.db'
+
+    def setUp(self):
+        DB(self.file, mode='w').open().disconnect()
+        self.reader = DB(self.file).open()
+
+    def test_statements(self):
+        dbfile = DB(self.file, group_commit=3).open()
+        dbfile['A'] = 1
+        dbfile['B'] = 2
+        self.assertEqual(0, len(self.reader))
+        dbfile['C'] = 3
+        self.assertEqual(3, len(self.reader))
+        dbfile['D'] = 4
+        dbfile.flush()
+        self.assertEqual(4, len(self.reader))
+        dbfile.disconnect()
+
+    def test_interval(self):
+        dbfile = DB(self.file, group_interval=0).open()
+        dbfile['A'] = 1
+        self.assertEqual(1, len(self.reader))
+        dbfile.disconnect()
+
+    def test_disconnect(self):
+        dbfile = DB(self.file, group_commit=100).open()
+        dbfile['A'] = 1
+        dbfile.disconnect()
+        self.assertEqual(1, len(self.reader))
+
+    def test_transaction(self):
+        dbfile = DB(self.file, group_commit=100).open()
+        dbfile['A'] = 1
+        with dbfile.transaction() as db:
+            db['B'] = 2
+        self.assertEqual(2, len(self.reader))
+        dbfile.disconnect()
+
+    def test_operation(self):
+        # Groups are committed once the operation completes, never half-way through
+        dbfile = DB(self.file, group_commit=1).open()
+        dbfile['A'] = [1, [2, 3]]
+        self.assertEqual([1, [2, 3]], self.reader['A'].py)
+        committed = []
+        insert_many = dbfile.insert_many
+
+        def check_insert_many(rows):
+            committed.append(self.reader['A'].py)
+            insert_many(rows)
+
+        dbfile.insert_many = check_insert_many
+        dbfile['A'].py = [4, [5]]  # Empties the list, then inserts the new items
+        self.assertEqual([[1, [2, 3]]], committed)
+        self.assertEqual([4, [5]], self.reader['A'].py)
+        dbfile.disconnect()
+
+    def tearDown(self):
+        self.reader.disconnect()
+        os.remove(self.file)
+
+
 class TestDBTransaction(unittest.TestCase):
 
     file = 'unittest.sqlebra.db'
@@ -108,6 +472,33 @@ class TestDBTransaction(unittest.TestCase):
             db['B'] = 11
             db['C'] = 12
 
+    def test_2_nested(self):
+        with self.dbfile.transaction() as db:
+            db['D'] = [0]
+            for i in range(1, 4):
+                try:
+                    with db.transaction():
+                        db['D'].append(i)
+                        if i == 2:
+                            raise ValueError
+                except ValueError:
+                    pass
+        # Only the failed nested transaction is rolled back
+        self.assertEqual([0, 1, 3], self.dbfile['D'].py)
+
+    def test_3_rollback(self):
+        with self.assertRaises(ValueError):
+            with self.dbfile.transaction() as db:
+                db['E'] = 1
+                with db.transaction():
+                    db['F'] = 2
+                raise ValueError
+        self.assertNotIn('E', self.dbfile)
+        self.assertNotIn('F', self.dbfile)
+
+    def test_4_class(self):
+        self.assertIs(type(self.dbfile.transaction()), type(self.dbfile.transaction()))
+
     @classmethod
     def tearDownClass(cls):
         cls.dbfile.disconnect()